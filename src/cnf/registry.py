@@ -4,9 +4,10 @@ import json
 from pathlib import Path
 from typing import List, Optional
 
-import yaml
 from pydantic import BaseModel, Field
 
+from cnf.utils import load_yaml
+
 
 class Host(BaseModel):
     """Probe host definition."""
@@ -82,8 +83,7 @@ def load_inventory(inventory_file: Optional[Path] = None) -> List[Host]:
     if not inventory_file.exists():
         return []
     
-    with open(inventory_file) as f:
-        data = yaml.safe_load(f)
+    data = load_yaml(inventory_file)
     
     hosts = []
     for host_data in data.get("hosts", []):
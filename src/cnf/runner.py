@@ -9,6 +9,7 @@ from rich.console import Console
 from rich.progress import Progress, SpinnerColumn, TextColumn
 
 from cnf.registry import load_registry, Host
+from cnf.ssh import ssh_pool
 from cnf.utils import ensure_dir, get_timestamp, load_yaml, save_json
 from cnf.formatter import NetworkTestFormatter
 
@@ -235,4 +236,9 @@ async def run_test_plan(plan_file: Path, output_dir: Optional[Path] = None):
     """Load and run a test plan."""
     plan = load_yaml(plan_file)
     runner = TestRunner(plan, output_dir)
-    return await runner.run()
+    try:
+        return await runner.run()
+    finally:
+        # Pooled probe connections outlive individual tests; close them
+        # before the event loop goes away
+        await ssh_pool.close_all()
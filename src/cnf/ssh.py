@@ -1,8 +1,10 @@
 """SSH connectivity and remote command execution for probe nodes."""
 
 import asyncio
+import time
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import AsyncIterator, Dict, Literal, Optional, Tuple, Union, overload
 
 import asyncssh
 from asyncssh import SSHClientConnection
@@ -29,6 +31,13 @@ class SSHClient:
                     username=self.host.ssh_user or "ubuntu",
                     client_keys=[str(ssh_key)],
                     known_hosts=None,  # Skip host key verification for automation
+                    # Pooled connections live across many tests: keep them
+                    # alive, and skip zlib, which only costs CPU on JSON/pcap.
+                    # asyncssh already sets TCP_NODELAY on the socket, so
+                    # short command round trips are not Nagle-delayed.
+                    keepalive_interval=30,
+                    tcp_keepalive=True,
+                    compression_algs=["none"],
                 ),
                 timeout=timeout
             )
@@ -38,21 +47,39 @@ class SSHClient:
         except Exception as e:
             raise ConnectionError(f"SSH connection to {self.host.id} failed: {e}")
     
-    async def execute(self, command: str, timeout: int = 30) -> Tuple[int, str, str]:
-        """Execute command on remote host."""
+    @overload
+    async def execute(
+        self, command: str, timeout: int = 30, raw: Literal[False] = ...
+    ) -> Tuple[int, str, str]: ...
+
+    @overload
+    async def execute(
+        self, command: str, timeout: int = 30, *, raw: Literal[True]
+    ) -> Tuple[int, bytes, bytes]: ...
+
+    async def execute(
+        self, command: str, timeout: int = 30, raw: bool = False
+    ) -> Union[Tuple[int, str, str], Tuple[int, bytes, bytes]]:
+        """Execute command on remote host.
+        
+        With raw=True stdout/stderr are returned as undecoded bytes, which
+        saves a decode pass for output that is only counted or parsed as
+        numbers.
+        """
         if not self.conn:
             await self.connect()
         
         try:
             result = await asyncio.wait_for(
-                self.conn.run(command),
+                self.conn.run(command, encoding=None) if raw else self.conn.run(command),
                 timeout=timeout
             )
             return result.exit_status or 0, result.stdout, result.stderr
         except asyncio.TimeoutError:
-            return -1, "", f"Command timed out: {command}"
+            error = f"Command timed out: {command}"
         except Exception as e:
-            return -1, "", f"Command failed: {e}"
+            error = f"Command failed: {e}"
+        return (-1, b"", error.encode()) if raw else (-1, "", error)
     
     async def close(self):
         """Close SSH connection."""
@@ -69,6 +96,100 @@ class SSHClient:
         await self.close()
 
 
+class SSHConnectionPool:
+    """Shares one authenticated SSH connection per probe across tests.
+
+    asyncssh runs every command on its own session over the same
+    connection, so callers that acquire the same host concurrently all
+    multiplex over a single TCP/SSH handshake. Connections idle longer
+    than ``ttl`` seconds are closed on the next acquire.
+    """
+
+    def __init__(self, ttl: float = 300):
+        self.ttl = ttl
+        self._clients: Dict[Tuple[str, str], SSHClient] = {}
+        self._refs: Dict[Tuple[str, str], int] = {}
+        self._last_used: Dict[Tuple[str, str], float] = {}
+        self._locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @staticmethod
+    def _key(host: Host) -> Tuple[str, str]:
+        return (host.ssh_user or "ubuntu", host.public_ip or host.private_ip or host.id)
+
+    def _bind_loop(self):
+        """Drop state left over from a previous event loop (asyncio.run call)."""
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._clients.clear()
+            self._refs.clear()
+            self._last_used.clear()
+            self._locks.clear()
+            self._loop = loop
+
+    @asynccontextmanager
+    async def acquire(self, host: Host) -> AsyncIterator[SSHClient]:
+        """Borrow a connected client for host; the connection stays open on exit."""
+        self._bind_loop()
+        key = self._key(host)
+
+        await self._reap_idle()
+        async with self._locks.setdefault(key, asyncio.Lock()):
+            client = self._clients.get(key)
+            if client is not None and self._is_dead(client):
+                # Dropped by a keepalive failure or a server-side close:
+                # discard it so this and later tests reconnect
+                await client.close()
+                client = None
+            if client is None:
+                client = SSHClient(host)
+                await client.connect()
+                self._clients[key] = client
+            self._refs[key] = self._refs.get(key, 0) + 1
+
+        try:
+            yield client
+        finally:
+            self.release(host)
+
+    def release(self, host: Host):
+        """Return a client borrowed with acquire()."""
+        key = self._key(host)
+        if key in self._refs:
+            self._refs[key] = max(self._refs[key] - 1, 0)
+            self._last_used[key] = time.monotonic()
+
+    @staticmethod
+    def _is_dead(client: SSHClient) -> bool:
+        return client.conn is None or client.conn.is_closed()
+
+    async def _reap_idle(self):
+        """Close unreferenced connections that are dead or idle past the TTL."""
+        now = time.monotonic()
+        for key in list(self._clients):
+            if self._refs.get(key, 0) > 0:
+                continue
+            if self._is_dead(self._clients[key]) or now - self._last_used.get(key, now) > self.ttl:
+                client = self._clients.pop(key)
+                self._refs.pop(key, None)
+                self._last_used.pop(key, None)
+                await client.close()
+
+    async def close_all(self):
+        """Close every pooled connection."""
+        self._bind_loop()
+        clients = list(self._clients.values())
+        self._clients.clear()
+        self._refs.clear()
+        self._last_used.clear()
+        for client in clients:
+            await client.close()
+
+
+# Process-wide pool used by the test modules
+ssh_pool = SSHConnectionPool()
+
+
 async def gather_host_facts(host: Host) -> dict:
     """Gather system facts from a probe host."""
     facts = {
@@ -110,7 +110,8 @@ async def comprehensive_target_test(
                                 host,
                                 capture.capture_file,
                                 http_start_time,
-                                http_phases
+                                http_phases,
+                                ssh=capture.ssh
                             )
 
                         # NEW: Correlate MTR to TCP handshake
@@ -2,7 +2,8 @@
 
 import asyncio
 import time
-from typing import Any, Dict, List
+from contextlib import nullcontext
+from typing import Any, Dict, List, Optional
 
 import dns.asyncresolver
 import dns.resolver
@@ -44,7 +45,9 @@ async def dns_query_local(hostname: str, qtype: str = "A", timeout: int = 5) ->
     return result
 
 
-async def dns_query_remote(host: Host, hostname: str, qtype: str = "A", timeout: int = 5) -> Dict[str, Any]:
+async def dns_query_remote(
+    host: Host, hostname: str, qtype: str = "A", timeout: int = 5, ssh: Optional[SSHClient] = None
+) -> Dict[str, Any]:
     """Perform DNS query from remote probe host."""
     result = {
         "hostname": hostname,
@@ -56,7 +59,7 @@ async def dns_query_remote(host: Host, hostname: str, qtype: str = "A", timeout:
     }
     
     try:
-        async with SSHClient(host) as ssh:
+        async with (nullcontext(ssh) if ssh else SSHClient(host)) as ssh:
             # Use dig for DNS query with timing
             cmd = f"dig +short +time={timeout} {hostname} {qtype}"
             
@@ -66,7 +69,7 @@ async def dns_query_remote(host: Host, hostname: str, qtype: str = "A", timeout:
             if returncode == 0 and stdout.strip():
                 result["success"] = True
                 result["query_time_ms"] = timer.elapsed_ms
-                result["answers"] = [line.strip() for line in stdout.strip().split("\n") if line.strip()]
+                result["answers"] = [line.strip() for line in stdout.splitlines() if line.strip()]
             else:
                 result["error"] = stderr or "No response"
                 
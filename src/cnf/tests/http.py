@@ -2,6 +2,7 @@
 
 import asyncio
 import time
+from contextlib import nullcontext
 from typing import Any, Dict, List, Optional
 
 import httpx
@@ -45,7 +46,9 @@ async def http_get_local(url: str, timeout: int = 15, verify: bool = True) -> Di
     return result
 
 
-async def http_test_remote(host: Host, url: str, method: str = "GET", timeout: int = 15) -> Dict[str, Any]:
+async def http_test_remote(
+    host: Host, url: str, method: str = "GET", timeout: int = 15, ssh: Optional[SSHClient] = None
+) -> Dict[str, Any]:
     """Perform HTTP request from remote probe host using curl."""
     result = {
         "url": url,
@@ -61,7 +64,7 @@ async def http_test_remote(host: Host, url: str, method: str = "GET", timeout: i
     }
     
     try:
-        async with SSHClient(host) as ssh:
+        async with (nullcontext(ssh) if ssh else SSHClient(host)) as ssh:
             # Use curl with timing output
             curl_format = (
                 'time_namelookup:%{time_namelookup}\\n'
@@ -82,7 +85,7 @@ async def http_test_remote(host: Host, url: str, method: str = "GET", timeout: i
             
             # Parse curl timing output
             timing_data = {}
-            for line in stdout.strip().split('\n'):
+            for line in stdout.splitlines():
                 if ':' in line:
                     key, value = line.split(':', 1)
                     timing_data[key] = value.strip()
@@ -185,7 +188,7 @@ async def _detailed_http_get(ssh: SSHClient, url: str, timeout: int) -> Dict[str
 
     # Parse timing data
     timing = {}
-    for line in stdout.strip().split('\n'):
+    for line in stdout.splitlines():
         if ':' in line:
             key, value = line.split(':', 1)
             timing[key] = value.strip()
@@ -2,6 +2,7 @@
 
 import asyncio
 import re
+from contextlib import nullcontext
 from typing import Any, Dict, List, Optional
 
 from cnf.registry import Host
@@ -40,7 +41,9 @@ def parse_ping_output(output: str) -> Dict[str, Any]:
     return stats
 
 
-async def ping_test_remote(host: Host, target: str, count: int = 4, timeout: int = 10) -> Dict[str, Any]:
+async def ping_test_remote(
+    host: Host, target: str, count: int = 4, timeout: int = 10, ssh: Optional[SSHClient] = None
+) -> Dict[str, Any]:
     """Run ICMP ping test from remote probe host."""
     result = {
         "target": target,
@@ -51,7 +54,7 @@ async def ping_test_remote(host: Host, target: str, count: int = 4, timeout: int
     }
     
     try:
-        async with SSHClient(host) as ssh:
+        async with (nullcontext(ssh) if ssh else SSHClient(host)) as ssh:
             cmd = f"ping -c {count} -W {timeout} {target}"
             returncode, stdout, stderr = await ssh.execute(cmd, timeout=timeout + 5)
             
@@ -8,6 +8,8 @@ Provides deep correlation between:
 """
 
 import asyncio
+from bisect import bisect_left
+from contextlib import nullcontext
 from typing import Any, Dict, List, Optional
 from datetime import datetime
 
@@ -19,7 +21,8 @@ async def correlate_tcp_to_http_phases(
     host: Host,
     capture_file: str,
     http_start_time: float,
-    http_phases: Dict[str, float]
+    http_phases: Dict[str, float],
+    ssh: Optional[SSHClient] = None
 ) -> Dict[str, Any]:
     """
     Correlate TCP packets to specific HTTP timing phases.
@@ -37,6 +40,8 @@ async def correlate_tcp_to_http_phases(
         http_start_time: Unix timestamp when HTTP request started
         http_phases: Dict with keys: dns_ms, tcp_handshake_ms, tls_handshake_ms,
                      server_process_ms, download_ms
+        ssh: Optional already-connected client to reuse instead of opening
+             a new connection to host
 
     Returns:
         Dict with TCP events correlated to each HTTP phase
@@ -67,7 +72,7 @@ async def correlate_tcp_to_http_phases(
     }
 
     try:
-        async with SSHClient(host) as ssh:
+        async with (nullcontext(ssh) if ssh else SSHClient(host)) as ssh:
             # Extract timestamped TCP events from packet capture
             tcp_events = await _extract_tcp_timeline(ssh, capture_file)
 
@@ -82,30 +87,29 @@ async def correlate_tcp_to_http_phases(
             server_end = tls_end + http_phases.get("server_process_ms", 0)
             download_end = server_end + http_phases.get("download_ms", 0)
 
+            # Phase boundaries in phase order; bisect_left maps a timestamp
+            # to the first phase whose end it does not exceed
+            boundaries = [tcp_end, tls_end, server_end, download_end]
+            phase_names = list(correlation["phases"])
+            retrans_per_phase = [0] * len(phase_names)
+            total_bytes = 0
+
             # Correlate TCP events to phases
             for event in tcp_events:
                 relative_time_ms = event["relative_time_ms"]
 
                 # Determine which phase this event belongs to
-                if relative_time_ms <= tcp_end:
-                    phase = "tcp_handshake"
-                elif relative_time_ms <= tls_end:
-                    phase = "tls_negotiation"
-                elif relative_time_ms <= server_end:
-                    phase = "server_processing"
-                elif relative_time_ms <= download_end:
-                    phase = "content_download"
-                else:
+                phase_idx = bisect_left(boundaries, relative_time_ms)
+                if phase_idx == len(boundaries):
                     continue  # After HTTP request completed
+                phase = phase_names[phase_idx]
 
                 # Add event to appropriate phase
                 correlation["phases"][phase]["tcp_events"].append(event)
 
                 # Track retransmissions per phase
                 if event.get("is_retransmission"):
-                    if phase not in correlation["retransmissions_by_phase"]:
-                        correlation["retransmissions_by_phase"][phase] = 0
-                    correlation["retransmissions_by_phase"][phase] += 1
+                    retrans_per_phase[phase_idx] += 1
 
                 # Track window size evolution
                 if "window_size" in event:
@@ -116,8 +120,12 @@ async def correlate_tcp_to_http_phases(
                     })
 
                 # Track bytes
-                if "length" in event:
-                    correlation["total_bytes"] += event["length"]
+                total_bytes += event.get("length") or 0
+
+            correlation["total_bytes"] = total_bytes
+            correlation["retransmissions_by_phase"] = {
+                phase_names[i]: count for i, count in enumerate(retrans_per_phase) if count
+            }
 
             # Calculate per-phase statistics
             for phase_name, phase_data in correlation["phases"].items():
@@ -144,19 +152,24 @@ async def _extract_tcp_timeline(ssh: SSHClient, capture_file: str) -> List[Dict[
 
     Returns list of events with relative timestamps and TCP details.
     """
-    events = []
-
     # Use tcpdump with timestamp and detailed output
     cmd = f"""sudo tcpdump -r {capture_file} -tttt -n -v tcp 2>/dev/null | head -1000"""
 
-    result = await ssh.run_command(cmd, timeout=30)
-    if result["exit_code"] != 0:
-        return events
+    returncode, stdout, _ = await ssh.execute(cmd, timeout=30)
+    if returncode != 0:
+        return []
+
+    # Parsing is CPU work; keep it off the event loop so concurrent SSH
+    # channels are not stalled behind it
+    return await asyncio.to_thread(_parse_tcpdump_text, stdout)
 
-    lines = result["stdout"].strip().split("\n")
+
+def _parse_tcpdump_text(stdout: str) -> List[Dict[str, Any]]:
+    """Parse verbose tcpdump text output into TCP event dicts."""
+    events = []
     first_timestamp = None
 
-    for line in lines:
+    for line in stdout.splitlines():
         if not line.strip():
             continue
 
@@ -170,43 +183,33 @@ async def _extract_tcp_timeline(ssh: SSHClient, capture_file: str) -> List[Dict[
             # Extract timestamp (first 4 parts typically)
             timestamp_str = " ".join(parts[:4])
 
-            # Find IP addresses
+            # Single pass over the tokens: IP addresses, flags, seq/ack,
+            # window size and packet length
             src_ip = None
             dst_ip = None
-            for i, part in enumerate(parts):
-                if ">" in part and i > 0:
-                    src_ip = parts[i-1]
-                    if i+1 < len(parts):
-                        dst_ip = parts[i+1].rstrip(":")
-                    break
-
-            # Extract TCP flags
             flags = None
-            for part in parts:
-                if part.startswith("Flags") and "[" in parts[parts.index(part)+1]:
-                    flags = parts[parts.index(part)+1].strip("[]")
-                    break
-
-            # Extract sequence numbers
             seq = None
             ack = None
-            for i, part in enumerate(parts):
-                if part.startswith("seq"):
-                    seq = parts[i+1].rstrip(",")
-                elif part.startswith("ack"):
-                    ack = parts[i+1].rstrip(",")
-
-            # Extract window size
             window = None
-            for i, part in enumerate(parts):
-                if part.startswith("win"):
-                    window = parts[i+1].rstrip(",")
-
-            # Extract packet length
             length = None
+            last = len(parts) - 1
             for i, part in enumerate(parts):
-                if part.startswith("length"):
-                    length = int(parts[i+1].rstrip(","))
+                nxt = parts[i+1] if i < last else ""
+                if src_ip is None and ">" in part and i > 0:
+                    src_ip = parts[i-1]
+                    if nxt:
+                        dst_ip = nxt.rstrip(":")
+                elif part.startswith("Flags"):
+                    if flags is None and "[" in nxt:
+                        flags = nxt.strip("[]")
+                elif part.startswith("seq"):
+                    seq = nxt.rstrip(",")
+                elif part.startswith("ack"):
+                    ack = nxt.rstrip(",")
+                elif part.startswith("win"):
+                    window = nxt.rstrip(",")
+                elif part.startswith("length"):
+                    length = int(nxt.rstrip(","))
 
             # Set first timestamp as reference
             if first_timestamp is None:
@@ -281,14 +284,17 @@ async def correlate_mtr_to_tcp(
                 )
 
             # Identify hops contributing most to latency
-            for hop in mtr_hops:
-                if hop.get("avg_ms", 0) > 5:  # Significant latency
-                    correlation["contributing_hops"].append({
-                        "hop_number": hop.get("hop"),
-                        "ip": hop.get("host"),
-                        "latency_ms": hop.get("avg_ms"),
-                        "loss_pct": hop.get("loss_pct", 0)
-                    })
+            # (> 5ms average counts as significant latency)
+            correlation["contributing_hops"] = [
+                {
+                    "hop_number": hop.get("hop"),
+                    "ip": hop.get("host"),
+                    "latency_ms": avg_ms,
+                    "loss_pct": hop.get("loss_pct", 0)
+                }
+                for hop in mtr_hops
+                if (avg_ms := hop.get("avg_ms", 0)) > 5
+            ]
 
             correlation["status"] = "success"
         else:
@@ -401,25 +407,37 @@ async def generate_layered_analysis(
     if http_result and http_result.get("status") == "success":
         stats = http_result.get("statistics", {})
 
+        total_avg = stats.get("total", {}).get("avg")
+        dns = stats.get("dns_lookup", {}).get("avg")
+        tcp = stats.get("tcp_handshake", {}).get("avg")
+        tls = stats.get("tls_handshake", {}).get("avg")
+        srv = stats.get("server_processing", {}).get("avg")
+        dl = stats.get("download", {}).get("avg")
+
         analysis["layer7"]["http_performance"] = {
-            "total_time_ms": stats.get("total", {}).get("avg"),
-            "dns_ms": stats.get("dns_lookup", {}).get("avg"),
-            "tcp_handshake_ms": stats.get("tcp_handshake", {}).get("avg"),
-            "tls_handshake_ms": stats.get("tls_handshake", {}).get("avg"),
-            "ttfb_ms": stats.get("server_processing", {}).get("avg"),
-            "download_ms": stats.get("download", {}).get("avg")
+            "total_time_ms": total_avg,
+            "dns_ms": dns,
+            "tcp_handshake_ms": tcp,
+            "tls_handshake_ms": tls,
+            "ttfb_ms": srv,
+            "download_ms": dl
         }
 
+        denominator = total_avg or 1
+
+        def pct(x: Optional[float]) -> float:
+            return round((x or 0) * 100.0 / denominator, 1)
+
         analysis["layer7"]["phase_breakdown"] = {
-            "dns_pct": round((stats.get("dns_lookup", {}).get("avg", 0) / stats.get("total", {}).get("avg", 1)) * 100, 1),
-            "tcp_pct": round((stats.get("tcp_handshake", {}).get("avg", 0) / stats.get("total", {}).get("avg", 1)) * 100, 1),
-            "tls_pct": round((stats.get("tls_handshake", {}).get("avg", 0) / stats.get("total", {}).get("avg", 1)) * 100, 1),
-            "server_pct": round((stats.get("server_processing", {}).get("avg", 0) / stats.get("total", {}).get("avg", 1)) * 100, 1),
-            "download_pct": round((stats.get("download", {}).get("avg", 0) / stats.get("total", {}).get("avg", 1)) * 100, 1)
+            "dns_pct": pct(dns),
+            "tcp_pct": pct(tcp),
+            "tls_pct": pct(tls),
+            "server_pct": pct(srv),
+            "download_pct": pct(dl)
         }
 
         # Grade L7 quality
-        total_ms = stats.get("total", {}).get("avg", 999)
+        total_ms = total_avg if total_avg is not None else 999
         if total_ms < 100:
             analysis["layer7"]["quality"] = "excellent"
         elif total_ms < 500:
@@ -439,7 +457,7 @@ async def generate_layered_analysis(
                 "severity": "high",
                 "message": "Network path quality is directly impacting TCP connection quality"
             })
-        elif analysis["layer3"]["quality"] == "excellent" but analysis["layer4"]["quality"] == "degraded":
+        elif analysis["layer3"]["quality"] == "excellent" and analysis["layer4"]["quality"] == "degraded":
             analysis["correlations"]["l3_l4"]["finding"] = "TCP issues despite good path (endpoint problem?)"
             analysis["insights"].append({
                 "type": "correlation",
@@ -463,10 +481,16 @@ async def generate_layered_analysis(
             })
 
     # End-to-end insights
-    if all(analysis[f"layer{i}"]["quality"] == "excellent" for i in [3, 4, 7] if analysis[f"layer{i}"]["quality"] != "unknown"):
+    qualities = [
+        analysis["layer3"]["quality"],
+        analysis["layer4"]["quality"],
+        analysis["layer7"]["quality"]
+    ]
+    known = [q for q in qualities if q != "unknown"]
+    if known and all(q == "excellent" for q in known):
         analysis["overall_grade"] = "A+"
         analysis["correlations"]["end_to_end"]["summary"] = "Excellent performance across all layers"
-    elif "degraded" in [analysis[f"layer{i}"]["quality"] for i in [3, 4, 7]]:
+    elif "degraded" in qualities:
         analysis["overall_grade"] = "C"
         analysis["correlations"]["end_to_end"]["summary"] = "Performance degraded at one or more layers"
     else:
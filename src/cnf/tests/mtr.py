@@ -1,12 +1,27 @@
 """MTR (My TraceRoute) network path analysis tests."""
 
 import asyncio
-import json
+import hashlib
 import re
+from contextlib import nullcontext
 from typing import Any, Dict, List, Optional
 
+try:
+    import orjson as _json
+except ImportError:  # orjson is optional; fall back to the stdlib parser
+    import json as _json
+
 from cnf.registry import Host
-from cnf.ssh import SSHClient
+from cnf.ssh import SSHClient, ssh_pool
+
+# mtr report hop line (see _parse_mtr_text)
+_MTR_HOP_RE = re.compile(
+    r'^[ \t]*(\d+)\.\|--\s+(\S+)\s+(\d+\.\d+)%\s+(\d+)\s+(\d+\.\d+)\s+(\d+\.\d+)\s+(\d+\.\d+)\s+(\d+\.\d+)\s+(\d+\.\d+)',
+    re.MULTILINE,
+)
+
+# Per-host cache of whether the remote mtr supports JSON output (-j)
+_MTR_JSON_OK: Dict[str, bool] = {}
 
 
 async def run_mtr_test(
@@ -14,7 +29,8 @@ async def run_mtr_test(
     target: str,
     count: int = 10,
     report_cycles: int = 10,
-    timeout: int = 120
+    timeout: int = 120,
+    ssh: Optional[SSHClient] = None
 ) -> Dict[str, Any]:
     """
     Run MTR test from probe host to target.
@@ -35,23 +51,19 @@ async def run_mtr_test(
     }
 
     try:
-        async with SSHClient(host) as ssh:
-            # Run MTR with JSON output for easy parsing
-            # Also run text version for display
-            cmd_json = f"mtr -n -c {report_cycles} -r -j {target} 2>/dev/null || echo 'MTR_FAILED'"
-            cmd_text = f"mtr -n -c {report_cycles} -r {target} 2>/dev/null || mtr -c {report_cycles} -r {target}"
-
-            # Try JSON output first (newer MTR versions)
-            stdout, stderr, exit_code = await ssh.run_command(cmd_json, timeout=timeout)
-
-            if "MTR_FAILED" in stdout or exit_code != 0:
-                # Fallback to text parsing
-                stdout, stderr, exit_code = await ssh.run_command(cmd_text, timeout=timeout)
-                result["raw_output"] = stdout
-                result["hops"] = _parse_mtr_text(stdout)
+        async with (nullcontext(ssh) if ssh else ssh_pool.acquire(host)) as ssh:
+            # Use JSON output where the installed MTR supports it (newer
+            # versions), otherwise parse the text report
+            if await _mtr_supports_json(ssh, host):
+                cmd = f"mtr -n -c {report_cycles} -r -j {target} 2>/dev/null"
+                parse = _parse_mtr_json
             else:
-                result["raw_output"] = stdout
-                result["hops"] = _parse_mtr_json(stdout)
+                cmd = f"mtr -n -c {report_cycles} -r {target} 2>/dev/null || mtr -c {report_cycles} -r {target}"
+                parse = _parse_mtr_text
+
+            exit_code, stdout, stderr = await ssh.execute(cmd, timeout=timeout)
+            result["raw_output"] = stdout
+            result["hops"] = parse(stdout)
 
             if result["hops"]:
                 result["status"] = "success"
@@ -70,10 +82,23 @@ async def run_mtr_test(
     return result
 
 
+async def _mtr_supports_json(ssh: SSHClient, host: Host) -> bool:
+    """Check (once per host) whether the remote mtr supports JSON output."""
+    if host.id not in _MTR_JSON_OK:
+        exit_code, _, _ = await ssh.execute("mtr --help 2>&1 | grep -q -- '--json'", timeout=10)
+        # Only cache definite answers: grep exits 1 when the help text has
+        # no --json, while a timeout or dropped connection (-1) says nothing
+        # about mtr and should be probed again next time
+        if exit_code not in (0, 1):
+            return False
+        _MTR_JSON_OK[host.id] = exit_code == 0
+    return _MTR_JSON_OK[host.id]
+
+
 def _parse_mtr_json(output: str) -> List[Dict[str, Any]]:
     """Parse MTR JSON output."""
     try:
-        data = json.loads(output)
+        data = _json.loads(output)
         hops = []
 
         for hop_data in data.get("report", {}).get("hubs", []):
@@ -104,29 +129,21 @@ def _parse_mtr_text(output: str) -> List[Dict[str, Any]]:
     # HOST: hostname                    Loss%   Snt   Last   Avg  Best  Wrst StDev
     #   1.|-- 172.31.0.1                 0.0%    10    0.3   0.3   0.2   0.4   0.1
 
-    lines = output.split('\n')
-    for line in lines:
-        # Match hop lines
-        match = re.match(
-            r'\s*(\d+)\.\|--\s+(\S+)\s+(\d+\.\d+)%\s+(\d+)\s+(\d+\.\d+)\s+(\d+\.\d+)\s+(\d+\.\d+)\s+(\d+\.\d+)\s+(\d+\.\d+)',
-            line
-        )
-
-        if match:
-            hop_num, host, loss, sent, last, avg, best, worst, stddev = match.groups()
-            hop = {
-                "hop": int(hop_num),
-                "host": host,
-                "loss_pct": float(loss),
-                "packets_sent": int(sent),
-                "packets_received": int(sent) - int(float(sent) * float(loss) / 100),
-                "last_ms": float(last),
-                "avg_ms": float(avg),
-                "best_ms": float(best),
-                "worst_ms": float(worst),
-                "stddev_ms": float(stddev)
-            }
-            hops.append(hop)
+    for match in _MTR_HOP_RE.finditer(output):
+        hop_num, host, loss, sent, last, avg, best, worst, stddev = match.groups()
+        hop = {
+            "hop": int(hop_num),
+            "host": host,
+            "loss_pct": float(loss),
+            "packets_sent": int(sent),
+            "packets_received": int(sent) - int(float(sent) * float(loss) / 100),
+            "last_ms": float(last),
+            "avg_ms": float(avg),
+            "best_ms": float(best),
+            "worst_ms": float(worst),
+            "stddev_ms": float(stddev)
+        }
+        hops.append(hop)
 
     return hops
 
@@ -217,7 +234,8 @@ async def continuous_mtr(
     host: Host,
     target: str,
     duration_seconds: int = 60,
-    interval: int = 1
+    interval: int = 1,
+    snapshot_seconds: int = 10
 ) -> Dict[str, Any]:
     """
     Run continuous MTR for extended period to detect intermittent issues.
@@ -226,27 +244,113 @@ async def continuous_mtr(
     - Route flapping
     - Intermittent packet loss
     - Latency variability over time
+
+    The run is split into snapshots of ``snapshot_seconds`` each. Identical
+    snapshots are stored once in ``unique_snapshots``; each entry in
+    ``snapshots`` only holds the hash and an index into that list.
+    ``hops`` aggregates every snapshot over the whole duration, and
+    ``raw_output`` holds every snapshot's report in order.
     """
     result = {
         "target": target,
         "duration_seconds": duration_seconds,
         "snapshots": [],
+        "unique_snapshots": [],
         "status": "unknown"
     }
+    raw_outputs: List[str] = []
+
+    snapshot_seconds = max(min(snapshot_seconds, duration_seconds), interval)
+    snapshot_count = max(duration_seconds // snapshot_seconds, 1)
+    cycles = max(snapshot_seconds // interval, 1)
+    seen: Dict[str, int] = {}
 
     try:
         async with SSHClient(host) as ssh:
-            # Run MTR in continuous mode for specified duration
-            cmd = f"timeout {duration_seconds} mtr -n -i {interval} -c {duration_seconds // interval} -r {target}"
-
-            stdout, stderr, exit_code = await ssh.run_command(cmd, timeout=duration_seconds + 30)
+            cmd = f"timeout {snapshot_seconds + 5} mtr -n -i {interval} -c {cycles} -r {target}"
+
+            for _ in range(snapshot_count):
+                exit_code, stdout, stderr = await ssh.execute(cmd, timeout=snapshot_seconds + 30)
+                raw_outputs.append(stdout)
+                hops = _parse_mtr_text(stdout)
+                if not hops:
+                    continue
+
+                snapshot_hash = _hash_hops(hops)
+                if snapshot_hash not in seen:
+                    seen[snapshot_hash] = len(result["unique_snapshots"])
+                    result["unique_snapshots"].append(hops)
+
+                result["snapshots"].append({
+                    "hash": snapshot_hash,
+                    "hops_ref": seen[snapshot_hash]
+                })
 
-            result["raw_output"] = stdout
-            result["hops"] = _parse_mtr_text(stdout)
-            result["status"] = "success" if result["hops"] else "failed"
+            if result["snapshots"]:
+                result["hops"] = _merge_mtr_snapshots([
+                    result["unique_snapshots"][snap["hops_ref"]]
+                    for snap in result["snapshots"]
+                ])
+                result["status"] = "success"
+            else:
+                result["hops"] = []
+                result["status"] = "failed"
 
     except Exception as e:
         result["status"] = "error"
         result["error"] = str(e)
 
+    result["raw_output"] = "\n".join(raw_outputs)
+    return result
+
+
+def _hash_hops(hops: List[Dict[str, Any]]) -> str:
+    """Hash the path-identifying fields of a hop list for snapshot dedup.
+
+    Uses a fixed digest rather than hash(), which is salted per process,
+    so the stored hashes compare across runs.
+    """
+    key = "|".join(
+        f"{h['hop']},{h['host']},{h['loss_pct']},{round(h['avg_ms'], 1)}"
+        for h in hops
+    )
+    return hashlib.blake2b(key.encode(), digest_size=8).hexdigest()
+
+
+def _merge_mtr_snapshots(snapshots: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Aggregate per-snapshot hop lists into one hop list for the whole run.
+
+    Packet counts are summed and loss recomputed from them, averages are
+    weighted by packets received, best/worst take the extremes and stddev
+    the largest seen. Host and last_ms come from the latest snapshot.
+    """
+    merged: Dict[int, Dict[str, Any]] = {}
+
+    for hops in snapshots:
+        for hop in hops:
+            agg = merged.get(hop["hop"])
+            if agg is None:
+                merged[hop["hop"]] = {**hop, "_weighted_ms": hop["avg_ms"] * hop["packets_received"]}
+                continue
+
+            agg["host"] = hop["host"]
+            agg["last_ms"] = hop["last_ms"]
+            agg["packets_sent"] += hop["packets_sent"]
+            agg["packets_received"] += hop["packets_received"]
+            agg["_weighted_ms"] += hop["avg_ms"] * hop["packets_received"]
+            agg["best_ms"] = min(agg["best_ms"], hop["best_ms"])
+            agg["worst_ms"] = max(agg["worst_ms"], hop["worst_ms"])
+            agg["stddev_ms"] = max(agg["stddev_ms"], hop["stddev_ms"])
+
+    result = []
+    for hop_num in sorted(merged):
+        hop = merged[hop_num]
+        weighted_ms = hop.pop("_weighted_ms")
+        sent, received = hop["packets_sent"], hop["packets_received"]
+        if sent:
+            hop["loss_pct"] = round(100.0 * (sent - received) / sent, 1)
+        if received:
+            hop["avg_ms"] = round(weighted_ms / received, 1)
+        result.append(hop)
+
     return result
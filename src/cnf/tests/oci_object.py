@@ -5,15 +5,52 @@ Includes advanced diagnostics for bufferbloat, conntrack exhaustion, and packet
 """
 
 import asyncio
+import functools
 import re
+from contextlib import nullcontext
 from typing import Any, Dict, List, Optional
 
 from cnf.registry import Host
-from cnf.ssh import SSHClient
-from cnf.utils import Timer, load_yaml, get_config_dir
+from cnf.ssh import SSHClient, ssh_pool
+from cnf.utils import Timer, load_yaml, get_config_dir, run_bounded
 
+# Resolved against get_config_dir() lazily (on first load), so importing this
+# module never depends on the working directory having a configs dir
+_OCI_CFG_FILE = "oci_endpoints.yaml"
 
-async def check_conntrack_status(host: Host) -> Dict[str, Any]:
+# Concurrent SSH sessions per probe; sshd's default MaxSessions is 10
+_MAX_SSH_SESSIONS = 8
+
+# ping summary line: rtt min/avg/max/mdev = 1.0/2.0/3.0/0.5 ms
+_RTT_RE = re.compile(r'rtt min/avg/max/(?:mdev|stddev) = ([\d.]+)/([\d.]+)/([\d.]+)/([\d.]+)')
+
+# fping -q summary: 1.1.1.1 : xmt/rcv/%loss = 20/20/0%, min/avg/max = 1.0/2.0/3.0
+_FPING_RE = re.compile(
+    r"^(\S+)\s*: xmt/rcv/%loss = [^,\n]*(, min/avg/max = [\d.]+/([\d.]+)/([\d.]+))?",
+    re.MULTILINE,
+)
+
+
+@functools.lru_cache(maxsize=1)
+def _load_oci_endpoints():
+    """Load oci_endpoints.yaml once and index its endpoints by region and hostname."""
+    oci_config = load_yaml(get_config_dir() / _OCI_CFG_FILE)
+    endpoints = oci_config.get("endpoints", [])
+    by_region = {ep["region"]: ep for ep in endpoints if ep.get("region")}
+    by_hostname = {ep["hostname"]: ep for ep in endpoints if ep.get("hostname")}
+    return oci_config, by_region, by_hostname
+
+
+def _find_oci_endpoint(endpoint: str) -> Optional[Dict[str, Any]]:
+    """Look up an endpoint config by region, hostname, or a URL containing the hostname."""
+    _, by_region, by_hostname = _load_oci_endpoints()
+    ep = by_region.get(endpoint) or by_hostname.get(endpoint)
+    if ep is None:
+        ep = next((e for name, e in by_hostname.items() if name in endpoint), None)
+    return ep
+
+
+async def check_conntrack_status(host: Host, ssh: Optional[SSHClient] = None) -> Dict[str, Any]:
     """Check Linux netfilter connection tracking table status.
     
     Detects potential conntrack table exhaustion which can cause:
@@ -33,24 +70,22 @@ async def check_conntrack_status(host: Host) -> Dict[str, Any]:
     }
     
     try:
-        async with SSHClient(host) as ssh:
-            # Check current count
+        async with (nullcontext(ssh) if ssh else ssh_pool.acquire(host)) as ssh:
+            # Read count, max and recent dmesg conntrack lines in one round-trip
             returncode, stdout, _ = await ssh.execute(
-                "cat /proc/sys/net/netfilter/nf_conntrack_count 2>/dev/null || echo 'N/A'",
+                "cat /proc/sys/net/netfilter/nf_conntrack_count "
+                "/proc/sys/net/netfilter/nf_conntrack_max 2>/dev/null; "
+                "echo '---'; dmesg 2>/dev/null | grep -i conntrack | tail -5",
                 timeout=5
             )
+            counters, _, dmesg_out = stdout.partition('---')
+            values = counters.split()
             
-            if stdout.strip() != 'N/A':
-                result["count"] = int(stdout.strip())
-                
-                # Check max limit
-                returncode, stdout, _ = await ssh.execute(
-                    "cat /proc/sys/net/netfilter/nf_conntrack_max 2>/dev/null || echo 'N/A'",
-                    timeout=5
-                )
+            if values:
+                result["count"] = int(values[0])
                 
-                if stdout.strip() != 'N/A':
-                    result["max"] = int(stdout.strip())
+                if len(values) > 1:
+                    result["max"] = int(values[1])
                     result["usage_pct"] = (result["count"] / result["max"]) * 100
                     result["success"] = True
                     
@@ -61,10 +96,6 @@ async def check_conntrack_status(host: Host) -> Dict[str, Any]:
                         result["warning"] = f"WARNING: Conntrack table {result['usage_pct']:.1f}% full"
                     
                     # Check dmesg for conntrack errors
-                    returncode, dmesg_out, _ = await ssh.execute(
-                        "dmesg | grep -i conntrack | tail -5",
-                        timeout=5
-                    )
                     if "table full" in dmesg_out.lower():
                         result["dmesg_errors"] = dmesg_out.strip()
             else:
@@ -76,7 +107,9 @@ async def check_conntrack_status(host: Host) -> Dict[str, Any]:
     return result
 
 
-async def detect_bufferbloat(host: Host, target: str, ping_count: int = 100) -> Dict[str, Any]:
+async def detect_bufferbloat(
+    host: Host, target: str, ping_count: int = 100, ssh: Optional[SSHClient] = None
+) -> Dict[str, Any]:
     """Detect bufferbloat using ping variance analysis.
     
     Bufferbloat symptoms:
@@ -99,14 +132,14 @@ async def detect_bufferbloat(host: Host, target: str, ping_count: int = 100) ->
     }
     
     try:
-        async with SSHClient(host) as ssh:
+        async with (nullcontext(ssh) if ssh else ssh_pool.acquire(host)) as ssh:
             # Run rapid ping test
             cmd = f"ping -c {ping_count} -i 0.2 {target}"
             returncode, stdout, stderr = await ssh.execute(cmd, timeout=ping_count + 30)
             
             if returncode == 0 or "packets transmitted" in stdout:
                 # Parse statistics
-                match = re.search(r'rtt min/avg/max/(?:mdev|stddev) = ([\d.]+)/([\d.]+)/([\d.]+)/([\d.]+)', stdout)
+                match = _RTT_RE.search(stdout)
                 if match:
                     result["min_ms"] = float(match.group(1))
                     result["avg_ms"] = float(match.group(2))
@@ -148,7 +181,9 @@ async def detect_bufferbloat(host: Host, target: str, ping_count: int = 100) ->
     return result
 
 
-async def tcp_packet_analysis(host: Host, target: str, port: int = 443, duration: int = 10) -> Dict[str, Any]:
+async def tcp_packet_analysis(
+    host: Host, target: str, port: int = 443, duration: int = 10, ssh: Optional[SSHClient] = None
+) -> Dict[str, Any]:
     """Capture and analyze TCP packets for network anomalies.
     
     Detects:
@@ -171,7 +206,7 @@ async def tcp_packet_analysis(host: Host, target: str, port: int = 443, duration
     }
     
     try:
-        async with SSHClient(host) as ssh:
+        async with (nullcontext(ssh) if ssh else ssh_pool.acquire(host)) as ssh:
             # Check if tcpdump is available
             check_code, _, _ = await ssh.execute("which tcpdump", timeout=5)
             if check_code != 0:
@@ -179,27 +214,26 @@ async def tcp_packet_analysis(host: Host, target: str, port: int = 443, duration
                 return result
             
             # Note: Requires sudo/root for packet capture
-            # Capture packets and analyze with tcpdump
+            # Capture a bounded sample and reduce it on the probe; only the
+            # three counters (packets, SACK lines, retransmission lines) come back
             cmd = (
-                f"timeout {duration} sudo tcpdump -c 500 -nn "
-                f"host {target} and port {port} 2>&1 | head -100 || true"
+                f"timeout {duration} sudo tcpdump -c 100 -nn "
+                f"host {target} and port {port} 2>&1 | "
+                # -nn packet lines read "<time> IP <src> > <dst>: ..." (IP6
+                # for v6); match that rather than the target, which may be a
+                # hostname that never appears in numeric output
+                "awk '/ IP6? / {n++} /[Ss][Aa][Cc][Kk]/ {s++} /[Rr][Ee][Tt][Rr][Aa][Nn][Ss][Mm][Ii][Ss][Ss][Ii][Oo][Nn]/ {r++} "
+                "END {print n+0, s+0, r+0}'"
             )
             
-            returncode, stdout, stderr = await ssh.execute(cmd, timeout=duration + 5)
+            returncode, stdout, stderr = await ssh.execute(cmd, timeout=duration + 5, raw=True)
             
-            if stdout:
+            counts = stdout.split()
+            if len(counts) == 3 and int(counts[0]) > 0:
                 result["success"] = True
-                
-                # Count packets
-                packet_lines = [l for l in stdout.split('\n') if target in l]
-                result["packets_captured"] = len(packet_lines)
-                
-                # Detect SACK
-                sack_count = stdout.lower().count('sack')
+                packets, sack_count, retrans_count = (int(c) for c in counts)
+                result["packets_captured"] = packets
                 result["sack_events"] = sack_count
-                
-                # Detect retransmissions
-                retrans_count = stdout.lower().count('retransmission')
                 result["retransmissions"] = retrans_count
                 
                 # Calculate anomaly rate
@@ -217,7 +251,12 @@ async def tcp_packet_analysis(host: Host, target: str, port: int = 443, duration
     return result
 
 
-async def comprehensive_oci_test(host: Host, endpoint: str) -> Dict[str, Any]:
+async def comprehensive_oci_test(
+    host: Host,
+    endpoint: str,
+    ssh: Optional[SSHClient] = None,
+    sem: Optional[asyncio.Semaphore] = None
+) -> Dict[str, Any]:
     """Run comprehensive OCI Object Storage test suite.
     
     Combines multiple test types for complete analysis:
@@ -236,19 +275,10 @@ async def comprehensive_oci_test(host: Host, endpoint: str) -> Dict[str, Any]:
     
     # Load OCI endpoints config
     try:
-        oci_config_path = get_config_dir() / "oci_endpoints.yaml"
-        oci_config = load_yaml(oci_config_path)
-        endpoints = oci_config.get("endpoints", [])
-        
-        # Find endpoint config
-        endpoint_config = None
-        for ep in endpoints:
-            if ep.get("region") == endpoint or ep.get("hostname") in endpoint:
-                endpoint_config = ep
-                break
+        endpoint_config = _find_oci_endpoint(endpoint)
         
         if not endpoint_config:
-            return {"error": f"Endpoint {endpoint} not found in oci_endpoints.yaml"}
+            return {"error": f"Endpoint {endpoint} not found in {_OCI_CFG_FILE}"}
         
         hostname = endpoint_config.get("hostname")
         
@@ -262,25 +292,31 @@ async def comprehensive_oci_test(host: Host, endpoint: str) -> Dict[str, Any]:
         "overall_health": "UNKNOWN",
     }
     
-    # DNS test
-    result["tests"]["dns"] = await dns_query_remote(host, hostname, "A", timeout=5)
-    
-    # Latency test
-    result["tests"]["latency"] = await ping_test_remote(host, hostname, count=20)
-    
-    # TLS test
-    result["tests"]["tls"] = await tls_test_remote(host, hostname, port=443)
-    
-    # HTTP test with full timing
+    # Run the probes concurrently over one SSH connection, capped so we
+    # stay well under sshd's MaxSessions
     test_url = f"https://{hostname}/n/test/b/test/o/test"  # Will return 404 but that's expected
-    result["tests"]["http"] = await http_test_remote(host, test_url, "GET", timeout=15)
-    
-    # Bufferbloat detection
-    result["tests"]["bufferbloat"] = await detect_bufferbloat(host, hostname, ping_count=50)
-    
-    # System checks
-    result["tests"]["conntrack"] = await check_conntrack_status(host)
-    
+    try:
+        async with (nullcontext(ssh) if ssh else ssh_pool.acquire(host)) as ssh:
+            sem = sem or asyncio.Semaphore(4)
+            (
+                result["tests"]["dns"],
+                result["tests"]["latency"],
+                result["tests"]["tls"],
+                result["tests"]["http"],
+                result["tests"]["bufferbloat"],
+                result["tests"]["conntrack"],
+            ) = await asyncio.gather(
+                run_bounded(sem, dns_query_remote(host, hostname, "A", timeout=5, ssh=ssh)),
+                run_bounded(sem, ping_test_remote(host, hostname, count=20, ssh=ssh)),
+                run_bounded(sem, tls_test_remote(host, hostname, port=443, ssh=ssh)),
+                run_bounded(sem, http_test_remote(host, test_url, "GET", timeout=15, ssh=ssh)),
+                run_bounded(sem, detect_bufferbloat(host, hostname, ping_count=50, ssh=ssh)),
+                run_bounded(sem, check_conntrack_status(host, ssh=ssh)),
+            )
+    except ConnectionError as e:
+        result["error"] = str(e)
+        return result
+
     # Determine overall health
     issues = []
     warnings = []
@@ -303,7 +339,9 @@ async def comprehensive_oci_test(host: Host, endpoint: str) -> Dict[str, Any]:
     return result
 
 
-async def monitor_problem_ip(host: Host, ip: str = "134.70.16.1", threshold_ms: float = 100) -> Dict[str, Any]:
+async def monitor_problem_ip(
+    host: Host, ip: str = "134.70.16.1", threshold_ms: float = 100, ssh: Optional[SSHClient] = None
+) -> Dict[str, Any]:
     """Monitor the previously problematic Oracle Phoenix IP (134.70.16.1).
     
     This IP previously showed 471ms latency spikes but was resolved to 59.5ms.
@@ -320,29 +358,19 @@ async def monitor_problem_ip(host: Host, ip: str = "134.70.16.1", threshold_ms:
     }
     
     try:
-        async with SSHClient(host) as ssh:
+        async with (nullcontext(ssh) if ssh else ssh_pool.acquire(host)) as ssh:
             # Run extended ping test
             cmd = f"ping -c 20 -i 0.5 {ip}"
             returncode, stdout, stderr = await ssh.execute(cmd, timeout=20)
             
             if returncode == 0 or "packets transmitted" in stdout:
                 # Parse avg latency
-                match = re.search(r'rtt min/avg/max/(?:mdev|stddev) = ([\d.]+)/([\d.]+)/([\d.]+)/([\d.]+)', stdout)
+                match = _RTT_RE.search(stdout)
                 if match:
                     result["current_latency_ms"] = float(match.group(2))
                     result["max_latency_ms"] = float(match.group(3))
                     result["success"] = True
-                    
-                    # Check against threshold
-                    if result["current_latency_ms"] > threshold_ms:
-                        result["status"] = "ALERT"
-                        result["warning"] = (
-                            f"Latency {result['current_latency_ms']:.1f}ms exceeds threshold {threshold_ms}ms "
-                            f"(previously 471ms, resolved to 59.5ms)"
-                        )
-                    else:
-                        result["status"] = "OK"
-                        result["message"] = f"Latency {result['current_latency_ms']:.1f}ms is within normal range"
+                    _classify_monitor_latency(result)
             else:
                 result["error"] = "Ping failed"
                 
@@ -352,10 +380,101 @@ async def monitor_problem_ip(host: Host, ip: str = "134.70.16.1", threshold_ms:
     return result
 
 
+def _classify_monitor_latency(result: Dict[str, Any]):
+    """Set status/warning on a monitor result by comparing latency to its threshold."""
+    threshold_ms = result["threshold_ms"]
+    if result["current_latency_ms"] > threshold_ms:
+        result["status"] = "ALERT"
+        result["warning"] = (
+            f"Latency {result['current_latency_ms']:.1f}ms exceeds threshold {threshold_ms}ms "
+            f"(previously 471ms, resolved to 59.5ms)"
+        )
+    else:
+        result["status"] = "OK"
+        result["message"] = f"Latency {result['current_latency_ms']:.1f}ms is within normal range"
+
+
+async def monitor_ips_batch(
+    host: Host, ips: List[str], threshold_ms: float = 100, ssh: Optional[SSHClient] = None
+) -> List[Dict[str, Any]]:
+    """Monitor several IPs with a single fping run on the probe.
+    
+    Returns one monitor_problem_ip-style result per IP, in order. Falls back
+    to sequential monitor_problem_ip calls when fping is not installed.
+    """
+    if not ips:
+        return []
+    
+    results = [
+        {
+            "test": "problem_ip_monitor",
+            "ip": ip,
+            "threshold_ms": threshold_ms,
+            "success": False,
+            "current_latency_ms": None,
+            "status": None,
+            "error": None,
+        }
+        for ip in ips
+    ]
+    
+    try:
+        async with (nullcontext(ssh) if ssh else ssh_pool.acquire(host)) as ssh:
+            check_code, _, _ = await ssh.execute("command -v fping", timeout=5)
+            if check_code != 0:
+                # One session at a time, as before fping batching
+                return [await monitor_problem_ip(host, ip, threshold_ms, ssh=ssh) for ip in ips]
+            
+            # fping -q prints one summary line per target on stderr
+            cmd = f"fping -c 20 -p 500 -q {' '.join(ips)}"
+            returncode, stdout, stderr = await ssh.execute(cmd, timeout=30)
+            
+            summaries = {match.group(1): match for match in _FPING_RE.finditer(stderr)}
+            
+            for result in results:
+                match = summaries.get(result["ip"])
+                if match and match.group(2):
+                    result["current_latency_ms"] = float(match.group(3))
+                    result["max_latency_ms"] = float(match.group(4))
+                    result["success"] = True
+                    _classify_monitor_latency(result)
+                else:
+                    result["error"] = "Ping failed"
+                    
+    except Exception as e:
+        for result in results:
+            result["error"] = f"IP monitoring failed: {e}"
+    
+    return results
+
+
 async def run_oci_object_tests(host: Host, targets: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    """Run Oracle Object Storage specific tests."""
-    results = []
+    """Run Oracle Object Storage specific tests.
+    
+    All targets run concurrently over the shared SSH connection, with the
+    total number of open sessions capped at _MAX_SSH_SESSIONS. Each
+    target's monitor IPs are checked with one fping run. Results keep the
+    order of the targets list.
+    """
+    sem = asyncio.Semaphore(_MAX_SSH_SESSIONS)
+    
+    async def run_individual(endpoint: str, test_types: List[str]) -> Dict[str, Any]:
+        test_result = {
+            "endpoint": endpoint,
+            "tests": {},
+        }
+        
+        if "bufferbloat_detection" in test_types:
+            # Get hostname from endpoint
+            ep_config = _load_oci_endpoints()[1].get(endpoint)
+            if ep_config:
+                test_result["tests"]["bufferbloat"] = await run_bounded(
+                    sem, detect_bufferbloat(host, ep_config["hostname"])
+                )
+        
+        return test_result
     
+    tasks = []
     for target in targets:
         endpoint = target.get("endpoint")
         test_types = target.get("test_types", [])
@@ -363,29 +482,18 @@ async def run_oci_object_tests(host: Host, targets: List[Dict[str, Any]]) -> Lis
         
         # Run comprehensive test if requested
         if "full_suite" in test_types or len(test_types) == 0:
-            result = await comprehensive_oci_test(host, endpoint)
-            results.append(result)
+            tasks.append(comprehensive_oci_test(host, endpoint, sem=sem))
         else:
-            # Run individual tests
-            test_result = {
-                "endpoint": endpoint,
-                "tests": {},
-            }
-            
-            if "bufferbloat_detection" in test_types:
-                # Get hostname from endpoint
-                oci_config = load_yaml(get_config_dir() / "oci_endpoints.yaml")
-                ep_config = next((e for e in oci_config["endpoints"] if e["region"] == endpoint), None)
-                if ep_config:
-                    test_result["tests"]["bufferbloat"] = await detect_bufferbloat(
-                        host, ep_config["hostname"]
-                    )
-            
-            results.append(test_result)
+            tasks.append(run_individual(endpoint, test_types))
         
-        # Monitor specific IPs if requested
-        for monitor_ip in monitor_ips:
-            monitor_result = await monitor_problem_ip(host, monitor_ip)
-            results.append(monitor_result)
+        # Monitor specific IPs if requested, all in one fping run
+        if monitor_ips:
+            tasks.append(run_bounded(sem, monitor_ips_batch(host, monitor_ips)))
     
+    results = []
+    for result in await asyncio.gather(*tasks):
+        if isinstance(result, list):
+            results.extend(result)
+        else:
+            results.append(result)
     return results
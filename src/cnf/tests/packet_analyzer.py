@@ -1,10 +1,124 @@
 """Comprehensive packet analysis for network diagnostics."""
 
+import asyncio
 import re
 from typing import Any, Dict, List, Optional
 
 from cnf.registry import Host
-from cnf.ssh import SSHClient
+from cnf.ssh import ssh_pool
+
+# Single-pass aggregation over tshark field output. Columns:
+# syn, ack, fin, reset, expert message, SACK left edge, window, TCP length
+_TSHARK_FIELDS = (
+    "-e tcp.flags.syn -e tcp.flags.ack -e tcp.flags.fin -e tcp.flags.reset "
+    "-e _ws.expert.message -e tcp.options.sack_le -e tcp.window_size -e tcp.len"
+)
+_TSHARK_AWK = r"""
+function on(v) { return v == "1" || v == "True" }
+{ total++ }
+on($1) && !on($2) { syn++ }
+on($1) && on($2) { synack++ }
+on($3) { fin++ }
+on($4) { rst++ }
+$5 ~ /retransmission/ { retrans++ }
+$5 ~ /Duplicate ACK/ { dupack++ }
+$5 ~ /out-of-order/ { ooo++ }
+$6 != "" { sack++ }
+$7 != "" { win += $7; nwin++ }
+$8 != "" { len += $8; nlen++ }
+END { printf "syn=%d synack=%d fin=%d rst=%d retrans=%d dupack=%d ooo=%d sack=%d total=%d avg_win=%.1f avg_len=%.1f\n", syn, synack, fin, rst, retrans, dupack, ooo, sack, total, (nwin ? win / nwin : 0), (nlen ? len / nlen : 0) }
+"""
+
+# Same metrics from one-line-per-packet tcpdump text, for probes without tshark
+_TCPDUMP_AWK = r"""
+/^[^ \t]/ { total++ }
+/retransmission/ { retrans++ }
+/dup ack/ { dupack++ }
+/out.of.order/ { ooo++ }
+/sack/ { sack++ }
+match($0, /Flags \[[^]]*\]/) {
+    f = substr($0, RSTART + 7, RLENGTH - 8)
+    if (index(f, "S")) { if (index(f, ".")) synack++; else syn++ }
+    if (index(f, "F")) fin++
+    if (index(f, "R")) rst++
+    if (match($0, /win [0-9]+/)) { win += substr($0, RSTART + 4, RLENGTH - 4); nwin++ }
+    if (match($0, /length [0-9]+/)) { len += substr($0, RSTART + 7, RLENGTH - 7); nlen++ }
+}
+END { printf "syn=%d synack=%d fin=%d rst=%d retrans=%d dupack=%d ooo=%d sack=%d total=%d avg_win=%.1f avg_len=%.1f\n", syn, synack, fin, rst, retrans, dupack, ooo, sack, total, (nwin ? win / nwin : 0), (nlen ? len / nlen : 0) }
+"""
+
+# Preferred path: parse the pcap in binary with dpkt on the probe, no text
+# formatting at all. Retransmission / dup-ACK / out-of-order use simple
+# per-flow sequence tracking, approximating tshark's expert analysis.
+_DPKT_SCRIPT = r"""
+import sys
+import dpkt
+
+syn = synack = fin = rst = retrans = dupack = ooo = sack = total = 0
+win = nwin = length = nlen = 0
+seen, next_seq, last_ack = set(), {}, {}
+
+with open(sys.argv[1], "rb") as f:
+    try:
+        reader = dpkt.pcap.Reader(f)
+    except ValueError:
+        f.seek(0)
+        reader = dpkt.pcapng.Reader(f)
+    link = reader.datalink()
+    for ts, buf in reader:
+        total += 1
+        try:
+            if link == 113:
+                ip = dpkt.sll.SLL(buf).data
+            elif link == 276:
+                ip = dpkt.sll2.SLL2(buf).data
+            elif link in (12, 14, 101):
+                ip = dpkt.ip.IP(buf)
+            else:
+                ip = dpkt.ethernet.Ethernet(buf).data
+        except Exception:
+            continue
+        tcp = getattr(ip, "data", None)
+        if not isinstance(tcp, dpkt.tcp.TCP):
+            continue
+
+        flags = tcp.flags
+        if flags & dpkt.tcp.TH_SYN:
+            if flags & dpkt.tcp.TH_ACK:
+                synack += 1
+            else:
+                syn += 1
+        if flags & dpkt.tcp.TH_FIN:
+            fin += 1
+        if flags & dpkt.tcp.TH_RST:
+            rst += 1
+        if any(kind == dpkt.tcp.TCP_OPT_SACK for kind, _ in dpkt.tcp.parse_opts(tcp.opts)):
+            sack += 1
+        win += tcp.win
+        nwin += 1
+        length += len(tcp.data)
+        nlen += 1
+
+        flow = (ip.src, tcp.sport, ip.dst, tcp.dport)
+        seg_len = len(tcp.data) + bool(flags & (dpkt.tcp.TH_SYN | dpkt.tcp.TH_FIN))
+        if seg_len:
+            if (flow, tcp.seq) in seen:
+                retrans += 1
+            elif tcp.seq < next_seq.get(flow, 0):
+                ooo += 1
+            seen.add((flow, tcp.seq))
+            next_seq[flow] = max(next_seq.get(flow, 0), tcp.seq + seg_len)
+        elif not flags & dpkt.tcp.TH_RST:
+            if last_ack.get(flow) == (tcp.ack, tcp.win):
+                dupack += 1
+            last_ack[flow] = (tcp.ack, tcp.win)
+
+print("syn=%d synack=%d fin=%d rst=%d retrans=%d dupack=%d ooo=%d sack=%d total=%d avg_win=%.1f avg_len=%.1f" % (
+    syn, synack, fin, rst, retrans, dupack, ooo, sack, total,
+    win / nwin if nwin else 0, length / nlen if nlen else 0))
+"""
+
+_METRIC_KEYS = ("syn", "synack", "fin", "rst", "retrans", "dupack", "ooo", "sack", "total")
 
 
 class PacketAnalyzer:
@@ -14,6 +128,7 @@ class PacketAnalyzer:
         self.host = host
         self.pcap_file = pcap_file
         self.ssh = None
+        self._metrics_cache: Optional[Dict[str, float]] = None
 
     async def analyze_full(self) -> Dict[str, Any]:
         """
@@ -37,14 +152,16 @@ class PacketAnalyzer:
         }
 
         try:
-            async with SSHClient(self.host) as ssh:
+            async with ssh_pool.acquire(self.host) as ssh:
                 self.ssh = ssh
 
                 # Run all analysis functions
                 result["tcp_analysis"] = await self._analyze_tcp_connections()
                 result["connection_metrics"] = await self._analyze_connection_quality()
                 result["performance_metrics"] = await self._analyze_performance()
-                result["issues_detected"] = await self._detect_issues()
+                result["issues_detected"] = self._detect_issues(
+                    result["tcp_analysis"], result["connection_metrics"]
+                )
 
                 result["status"] = "success"
 
@@ -54,103 +171,96 @@ class PacketAnalyzer:
 
         return result
 
-    async def _analyze_tcp_connections(self) -> Dict[str, Any]:
-        """Analyze TCP connection establishment and teardown."""
-        # Count connection attempts (SYN packets)
-        syn_cmd = f"""
-        sudo tcpdump -r {self.pcap_file} -n 'tcp[tcpflags] & tcp-syn != 0 and tcp[tcpflags] & tcp-ack == 0' 2>/dev/null | wc -l
+    async def _gather_all_metrics(self) -> Dict[str, float]:
         """
+        Read the capture once on the remote host and aggregate every metric.
 
-        # Count successful connections (SYN-ACK)
-        synack_cmd = f"""
-        sudo tcpdump -r {self.pcap_file} -n 'tcp[tcpflags] & tcp-syn != 0 and tcp[tcpflags] & tcp-ack != 0' 2>/dev/null | wc -l
+        Prefers a dpkt pass over the binary pcap (when python3-dpkt is
+        installed on the probe), then tshark (field output + expert info),
+        then a plain tcpdump pass. Every path reduces the packets to a single
+        line of key=value pairs, so only a few bytes cross the SSH channel.
+        The result is cached for the lifetime of the analyzer.
         """
+        if self._metrics_cache is not None:
+            return self._metrics_cache
+
+        cmd = (
+            "if sudo python3 -c 'import dpkt' >/dev/null 2>&1; then "
+            f"sudo python3 - {self.pcap_file} 2>/dev/null <<'CNF_DPKT'\n{_DPKT_SCRIPT}\nCNF_DPKT\n"
+            "elif command -v tshark >/dev/null 2>&1; then "
+            f"sudo tshark -r {self.pcap_file} -T fields {_TSHARK_FIELDS} 2>/dev/null | "
+            f"awk -F'\\t' '{_TSHARK_AWK}'; "
+            "else "
+            f"sudo tcpdump -r {self.pcap_file} -n 2>/dev/null | awk '{_TCPDUMP_AWK}'; "
+            "fi"
+        )
+
+        metrics: Dict[str, float] = {key: 0 for key in _METRIC_KEYS}
+        metrics["avg_win"] = 0.0
+        metrics["avg_len"] = 0.0
 
-        # Count connection closes (FIN)
-        fin_cmd = f"""
-        sudo tcpdump -r {self.pcap_file} -n 'tcp[tcpflags] & tcp-fin != 0' 2>/dev/null | wc -l
-        """
+        try:
+            returncode, stdout, stderr = await self.ssh.execute(cmd, timeout=60)
+        except Exception:
+            return metrics
 
-        # Count resets (RST)
-        rst_cmd = f"""
-        sudo tcpdump -r {self.pcap_file} -n 'tcp[tcpflags] & tcp-rst != 0' 2>/dev/null | wc -l
-        """
+        for pair in stdout.split():
+            key, _, value = pair.partition("=")
+            if key in _METRIC_KEYS:
+                metrics[key] = int(value)
+            elif key in metrics:
+                metrics[key] = float(value)
+
+        self._metrics_cache = metrics
+        return metrics
 
-        syn_count = await self._execute_count_cmd(syn_cmd)
-        synack_count = await self._execute_count_cmd(synack_cmd)
-        fin_count = await self._execute_count_cmd(fin_cmd)
-        rst_count = await self._execute_count_cmd(rst_cmd)
+    async def _analyze_tcp_connections(self) -> Dict[str, Any]:
+        """Analyze TCP connection establishment and teardown."""
+        metrics = await self._gather_all_metrics()
+
+        syn_count = metrics["syn"]
+        synack_count = metrics["synack"]
 
         return {
             "connection_attempts": syn_count,
             "successful_connections": synack_count,
-            "graceful_closes": fin_count,
-            "forced_closes": rst_count,
+            "graceful_closes": metrics["fin"],
+            "forced_closes": metrics["rst"],
             "connection_success_rate": (synack_count / syn_count * 100) if syn_count > 0 else 0
         }
 
     async def _analyze_connection_quality(self) -> Dict[str, Any]:
         """Analyze connection quality indicators."""
-        # Detect retransmissions
-        retrans_cmd = f"""
-        sudo tcpdump -r {self.pcap_file} -n -v 2>/dev/null | grep -c "retransmission"
-        """
-
-        # Detect duplicate ACKs
-        dup_ack_cmd = f"""
-        sudo tcpdump -r {self.pcap_file} -n -v 2>/dev/null | grep -c "dup ack"
-        """
-
-        # Detect out-of-order packets
-        ooo_cmd = f"""
-        sudo tcpdump -r {self.pcap_file} -n -v 2>/dev/null | grep -c "out.of.order"
-        """
+        metrics = await self._gather_all_metrics()
 
-        # Detect SACK (Selective Acknowledgment)
-        sack_cmd = f"""
-        sudo tcpdump -r {self.pcap_file} -n -v 2>/dev/null | grep -c "sack"
-        """
-
-        retrans_count = await self._execute_count_cmd(retrans_cmd)
-        dup_ack_count = await self._execute_count_cmd(dup_ack_cmd)
-        ooo_count = await self._execute_count_cmd(ooo_cmd)
-        sack_count = await self._execute_count_cmd(sack_cmd)
-
-        # Get total packet count for percentages
-        total_cmd = f"sudo tcpdump -r {self.pcap_file} -n 2>/dev/null | wc -l"
-        total_packets = await self._execute_count_cmd(total_cmd)
+        retrans_count = metrics["retrans"]
+        dup_ack_count = metrics["dupack"]
+        ooo_count = metrics["ooo"]
+        total_packets = metrics["total"]
 
         return {
             "total_packets": total_packets,
             "retransmissions": retrans_count,
             "duplicate_acks": dup_ack_count,
             "out_of_order": ooo_count,
-            "sack_events": sack_count,
+            "sack_events": metrics["sack"],
             "retransmission_rate": (retrans_count / total_packets * 100) if total_packets > 0 else 0,
             "quality_score": self._calculate_quality_score(retrans_count, dup_ack_count, ooo_count, total_packets)
         }
 
     async def _analyze_performance(self) -> Dict[str, Any]:
-        """Analyze performance metrics from packets."""
-        # Analyze window sizes
-        window_cmd = f"""
-        sudo tcpdump -r {self.pcap_file} -n -v 2>/dev/null | \
-        grep -oE 'win [0-9]+' | \
-        awk '{{sum+=$2; count++}} END {{if(count>0) print sum/count; else print 0}}'
         """
+        Analyze performance metrics from packets.
 
-        # Get packet size distribution
-        size_cmd = f"""
-        sudo tcpdump -r {self.pcap_file} -n 2>/dev/null | \
-        grep -oE 'length [0-9]+' | \
-        awk '{{sum+=$2; count++}} END {{if(count>0) print sum/count; else print 0}}'
+        With tshark the average window is the scaled receive window
+        (tcp.window_size rather than the raw tcp.window_size_value), which
+        is what makes window_scaling_detected meaningful; the tcpdump
+        fallback only sees the raw advertised value.
         """
+        metrics = await self._gather_all_metrics()
 
-        returncode, window_output, _ = await self.ssh.execute(window_cmd, timeout=30)
-        returncode, size_output, _ = await self.ssh.execute(size_cmd, timeout=30)
-
-        avg_window = float(window_output.strip()) if window_output.strip() else 0
-        avg_packet_size = float(size_output.strip()) if size_output.strip() else 0
+        avg_window = metrics["avg_win"]
+        avg_packet_size = metrics["avg_len"]
 
         return {
             "average_window_size": int(avg_window),
@@ -158,13 +268,15 @@ class PacketAnalyzer:
             "window_scaling_detected": avg_window > 65535
         }
 
-    async def _detect_issues(self) -> List[Dict[str, Any]]:
-        """Detect common network issues from packet analysis."""
+    def _detect_issues(
+        self,
+        tcp_metrics: Dict[str, Any],
+        quality_metrics: Dict[str, Any]
+    ) -> List[Dict[str, Any]]:
+        """Detect common network issues from already computed analysis results."""
         issues = []
 
         # Check for high retransmission rate
-        quality_metrics = await self._analyze_connection_quality()
-
         if quality_metrics["retransmission_rate"] > 5:
             issues.append({
                 "severity": "high",
@@ -200,8 +312,6 @@ class PacketAnalyzer:
             })
 
         # Check connection establishment
-        tcp_metrics = await self._analyze_tcp_connections()
-
         if tcp_metrics["forced_closes"] > tcp_metrics["graceful_closes"]:
             issues.append({
                 "severity": "medium",
@@ -220,14 +330,6 @@ class PacketAnalyzer:
 
         return issues
 
-    async def _execute_count_cmd(self, cmd: str) -> int:
-        """Execute a command that returns a count."""
-        try:
-            returncode, stdout, stderr = await self.ssh.execute(cmd, timeout=30)
-            return int(stdout.strip()) if stdout.strip() else 0
-        except Exception:
-            return 0
-
     def _calculate_quality_score(
         self,
         retrans: int,
@@ -239,14 +341,14 @@ class PacketAnalyzer:
         if total == 0:
             return "unknown"
 
+        # Issue rate thresholds of 0.1%, 1% and 5%, compared in integers
         issues = retrans + dup_acks + ooo
-        issue_rate = (issues / total) * 100
 
-        if issue_rate < 0.1:
+        if issues * 1000 < total:
             return "excellent"
-        elif issue_rate < 1:
+        elif issues * 100 < total:
             return "good"
-        elif issue_rate < 5:
+        elif issues * 20 < total:
             return "fair"
         else:
             return "poor"
@@ -272,7 +374,7 @@ class PacketAnalyzer:
 
             # Parse handshake timing (this is simplified - full implementation
             # would track sequence numbers)
-            lines = stdout.strip().split('\n')
+            lines = stdout.splitlines()
 
             result["status"] = "analyzed"
             result["raw_packet_count"] = len(lines)
@@ -334,8 +436,11 @@ async def compare_captures(
     analyzer1 = PacketAnalyzer(host, pcap_file1)
     analyzer2 = PacketAnalyzer(host, pcap_file2)
 
-    analysis1 = await analyzer1.analyze_full()
-    analysis2 = await analyzer2.analyze_full()
+    # Independent captures: analyze both at once over the pooled connection
+    analysis1, analysis2 = await asyncio.gather(
+        analyzer1.analyze_full(),
+        analyzer2.analyze_full()
+    )
 
     # Compare metrics
     result["comparison"] = {
@@ -1,14 +1,230 @@
 """Packet capture and analysis using tcpdump on remote probes."""
 
 import asyncio
+import io
+import ipaddress
 import json
+import re
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 from datetime import datetime
 
+try:
+    import dpkt
+except ImportError:  # dpkt is optional; analysis falls back to tcpdump on the probe
+    dpkt = None
+
 from cnf.registry import Host
 from cnf.ssh import SSHClient
 
+# Single-pass remote analysis for probes analyzed without dpkt. Both
+# programs tally flags, count retransmissions, time the first SYN -> SYN-ACK
+# and print the same JSON object from _ANALYZE_AWK_END.
+_ANALYZE_AWK_END = r"""
+END {
+    printf "{\"tcp_flags\": {\"SYN\": %d, \"SYN-ACK\": %d, \"ACK\": %d, \"FIN\": %d, \"RST\": %d, \"PSH\": %d}, ", synn, synack, ack, fin, rst, psh
+    printf "\"retransmission_count\": %d, \"first_ts\": %s, \"last_ts\": %s, \"handshake_ms\": %s}\n", retrans, (first == "" ? "null" : first), (last == "" ? "null" : last), (hs == "" ? "null" : hs)
+}
+"""
+
+# tshark field columns (tab separated): epoch, ip.src, ipv6.src, srcport,
+# ip.dst, ipv6.dst, dstport, syn, ack, fin, reset, push, expert message.
+# Retransmissions come from tshark's own TCP analysis.
+_TSHARK_FIELDS = (
+    "-e frame.time_epoch -e ip.src -e ipv6.src -e tcp.srcport "
+    "-e ip.dst -e ipv6.dst -e tcp.dstport "
+    "-e tcp.flags.syn -e tcp.flags.ack -e tcp.flags.fin -e tcp.flags.reset "
+    "-e tcp.flags.push -e _ws.expert.message"
+)
+_TSHARK_ANALYZE_AWK = r"""
+function on(v) { return v == "1" || v == "True" }
+{
+    if (first == "") first = $1
+    last = $1
+    if ($4 == "") next
+    src = $2 $3 ":" $4; dst = $5 $6 ":" $7
+    if (on($8)) {
+        if (on($9)) {
+            synack++
+            if (hs == "" && ((dst " " src) in syn)) hs = ($1 - syn[dst " " src]) * 1000
+        } else {
+            synn++
+            if (!((src " " dst) in syn)) syn[src " " dst] = $1
+        }
+    }
+    if (on($9)) ack++
+    if (on($10)) fin++
+    if (on($11)) rst++
+    if (on($12)) psh++
+    if ($13 ~ /retransmission/) retrans++
+}
+""" + _ANALYZE_AWK_END
+
+# Fallback over `tcpdump -nn -tt` text: flag tokens, and a data segment
+# counts as retransmitted when its flow repeats a starting sequence number.
+# Addresses are located from the IP/IP6 token, since -i any captures
+# (Linux cooked v2) print "<iface> In|Out" before it.
+_TCPDUMP_ANALYZE_AWK = r"""
+{
+    if (first == "") first = $1
+    last = $1
+    if (!match($0, /Flags \[[^]]*\]/)) next
+    tok = substr($0, RSTART + 7, RLENGTH - 8)
+    for (i = 2; i <= NF && $i != "IP" && $i != "IP6"; i++);
+    if (i + 3 > NF) next
+    src = $(i + 1); dst = $(i + 3); sub(/:$/, "", dst)
+    if (index(tok, "S")) {
+        if (index(tok, ".")) {
+            synack++
+            if (hs == "" && ((dst " " src) in syn)) hs = ($1 - syn[dst " " src]) * 1000
+        } else {
+            synn++
+            if (!((src " " dst) in syn)) syn[src " " dst] = $1
+        }
+    }
+    if (index(tok, ".")) ack++
+    if (index(tok, "F")) fin++
+    if (index(tok, "R")) rst++
+    if (index(tok, "P")) psh++
+    if (match($0, /seq [0-9]+:/)) {
+        key = src " " dst " " substr($0, RSTART + 4, RLENGTH - 5)
+        if (key in seen) retrans++
+        seen[key] = 1
+    }
+}
+""" + _ANALYZE_AWK_END
+
+# tcpdump exit summary on stderr: "42 packets captured"
+_CAPTURED_RE = re.compile(r"(\d+) packets? captured")
+
+# SFTP read size and pipelining depth for pulling captures off the probe
+_SFTP_BLOCK_SIZE = 128 * 1024
+_SFTP_MAX_REQUESTS = 64
+
+# IPv4 targets sharing a /24 collapse into one "net" clause at this count
+_NET_COALESCE_MIN = 3
+
+
+def _parse_pcap(data: bytes) -> Dict[str, Dict[str, Any]]:
+    """
+    Compute flag, retransmission and timing stats from pcap bytes in one pass.
+
+    Returns the same layout as the remote pass, keyed "tcp_flags",
+    "retransmissions" and "timing".
+    """
+    flags = {"SYN": 0, "SYN-ACK": 0, "ACK": 0, "FIN": 0, "RST": 0, "PSH": 0}
+    retrans_count = 0
+    seen = set()
+    syn_times: Dict[tuple, float] = {}
+    handshake_ms = None
+    first_ts = last_ts = None
+
+    buf = io.BytesIO(data)
+    try:
+        reader = dpkt.pcap.Reader(buf)
+    except ValueError:
+        buf.seek(0)
+        reader = dpkt.pcapng.Reader(buf)
+    link = reader.datalink()
+
+    for ts, frame in reader:
+        if first_ts is None:
+            first_ts = ts
+        last_ts = ts
+
+        try:
+            if link == dpkt.pcap.DLT_LINUX_SLL:
+                ip = dpkt.sll.SLL(frame).data
+            elif link == 276:  # DLT_LINUX_SLL2, written by newer tcpdump -i any
+                ip = dpkt.sll2.SLL2(frame).data
+            elif link in (12, 14, 101):  # raw IP
+                ip = dpkt.ip.IP(frame)
+            else:
+                ip = dpkt.ethernet.Ethernet(frame).data
+        except Exception:
+            continue
+        tcp = getattr(ip, "data", None)
+        if not isinstance(tcp, dpkt.tcp.TCP):
+            continue
+
+        bits = tcp.flags
+        flow = (ip.src, tcp.sport, ip.dst, tcp.dport)
+        if bits & dpkt.tcp.TH_SYN:
+            if bits & dpkt.tcp.TH_ACK:
+                flags["SYN-ACK"] += 1
+                reverse = (ip.dst, tcp.dport, ip.src, tcp.sport)
+                if handshake_ms is None and reverse in syn_times:
+                    handshake_ms = (ts - syn_times[reverse]) * 1000
+            else:
+                flags["SYN"] += 1
+                syn_times.setdefault(flow, ts)
+        if bits & dpkt.tcp.TH_ACK:
+            flags["ACK"] += 1
+        if bits & dpkt.tcp.TH_FIN:
+            flags["FIN"] += 1
+        if bits & dpkt.tcp.TH_RST:
+            flags["RST"] += 1
+        if bits & dpkt.tcp.TH_PUSH:
+            flags["PSH"] += 1
+
+        # Same sequence number carrying data twice on a flow = retransmission
+        if tcp.data:
+            if (flow, tcp.seq) in seen:
+                retrans_count += 1
+            seen.add((flow, tcp.seq))
+
+    return _analysis_result(flags, retrans_count, first_ts, last_ts, handshake_ms)
+
+
+def _analysis_result(
+    flags: Dict[str, int],
+    retrans_count: int,
+    first_ts: Optional[float],
+    last_ts: Optional[float],
+    handshake_ms: Optional[float]
+) -> Dict[str, Dict[str, Any]]:
+    """Shape capture statistics into the analyze_capture result layout."""
+    return {
+        "tcp_flags": flags,
+        "retransmissions": {
+            "retransmission_count": retrans_count,
+            "detected": retrans_count > 0
+        },
+        "timing": {
+            "handshake_ms": handshake_ms,
+            "first_packet_time": datetime.fromtimestamp(first_ts).isoformat() if first_ts else None,
+            "last_packet_time": datetime.fromtimestamp(last_ts).isoformat() if last_ts else None,
+            "handshake_detected": handshake_ms is not None
+        }
+    }
+
+
+def _targets_filter(targets: List[str]) -> str:
+    """
+    Build a BPF filter matching any of targets.
+
+    IPv4 addresses are grouped by /24 and a group of _NET_COALESCE_MIN or
+    more becomes a single "net X.Y.Z.0/24" clause, keeping the filter short
+    for large target lists. Everything else gets its own "host" clause.
+    """
+    groups: Dict[str, List[str]] = {}
+    for target in dict.fromkeys(targets):
+        try:
+            addr = ipaddress.IPv4Address(target)
+        except ValueError:
+            groups[target] = [target]
+            continue
+        net = str(ipaddress.IPv4Network(f"{addr}/24", strict=False))
+        groups.setdefault(net, []).append(target)
+
+    clauses = []
+    for net, members in groups.items():
+        if len(members) >= _NET_COALESCE_MIN:
+            clauses.append(f"net {net}")
+        else:
+            clauses.extend(f"host {ip}" for ip in members)
+    return " or ".join(clauses)
+
 
 class PacketCapture:
     """Manages packet captures on remote probe hosts."""
@@ -53,12 +269,20 @@ class PacketCapture:
         # -s: snapshot length (0 = capture full packet)
         # -c: packet count limit
         # -W: file size limit
+        # -U: flush each packet to the file as it is captured
         # -w: write to file
+        # stderr goes to a sidecar file so stop_capture can read tcpdump's
+        # "N packets captured" summary instead of re-reading the pcap
+        #
+        # Launched from a root shell that echoes tcpdump's own PID once it is
+        # still alive a moment later, or tcpdump's error output if it died
+        # (bad interface/filter), so start and check take one round trip.
         cmd = (
-            f"sudo tcpdump -i {interface} -n -s 0 "
+            f'sudo sh -c "nohup tcpdump -i {interface} -n -s 0 -U '
             f"-c {max_packets} -W {max_size_mb} "
             f"-w {self.capture_file} '{capture_filter}' "
-            f"> /dev/null 2>&1 &"
+            f'> /dev/null 2>{self.capture_file}.err & '
+            f'pid=\\$!; sleep 0.2; kill -0 \\$pid 2>/dev/null && echo \\$pid || cat {self.capture_file}.err"'
         )
 
         result = {
@@ -76,16 +300,12 @@ class PacketCapture:
             # Start tcpdump in background
             returncode, stdout, stderr = await self.ssh.execute(cmd, timeout=5)
 
-            # Get tcpdump process ID
-            pid_cmd = f"pgrep -f 'tcpdump.*{self.capture_file}'"
-            returncode, stdout, stderr = await self.ssh.execute(pid_cmd, timeout=5)
-
-            if stdout.strip():
+            if stdout.strip().isdigit():
                 result["pid"] = stdout.strip()
                 result["status"] = "capturing"
             else:
                 result["status"] = "failed"
-                result["error"] = "tcpdump process not found"
+                result["error"] = stdout.strip() or stderr.strip() or "tcpdump process not found"
 
         except Exception as e:
             result["status"] = "error"
@@ -107,30 +327,28 @@ class PacketCapture:
                 self.ssh = SSHClient(self.host)
                 await self.ssh.connect()
 
-            # Stop tcpdump (find and kill process)
-            stop_cmd = f"sudo pkill -f 'tcpdump.*{self.capture_file}'"
-            await self.ssh.execute(stop_cmd, timeout=5)
-
-            # Wait briefly for file to be written
-            await asyncio.sleep(2)
-
-            # Get file info
-            stat_cmd = f"ls -l {self.capture_file} 2>/dev/null || echo 'NOT_FOUND'"
-            returncode, stdout, stderr = await self.ssh.execute(stat_cmd, timeout=5)
-
-            if "NOT_FOUND" not in stdout and stdout.strip():
-                # Parse file size from ls output
-                parts = stdout.strip().split()
-                if len(parts) >= 5:
-                    result["file_size_bytes"] = int(parts[4])
-                    result["status"] = "completed"
+            # On SIGTERM tcpdump flushes and prints its summary; wait for it
+            # to exit (up to timeout), then report the file size and the
+            # summary in the same round trip. "[t]cpdump" keeps pkill/pgrep
+            # from matching this shell's own command line.
+            pattern = f"[t]cpdump.*{self.capture_file}"
+            stop_cmd = (
+                f"sudo pkill -f '{pattern}'; "
+                f"for i in $(seq {timeout * 10}); do "
+                f"pgrep -f '{pattern}' >/dev/null || break; sleep 0.1; done; "
+                f"stat -c %s {self.capture_file} 2>/dev/null || echo 'NOT_FOUND'; "
+                f"cat {self.capture_file}.err 2>/dev/null"
+            )
+            returncode, stdout, stderr = await self.ssh.execute(stop_cmd, timeout=timeout + 5)
 
-            # Get packet count using tcpdump
-            count_cmd = f"sudo tcpdump -r {self.capture_file} -n 2>/dev/null | wc -l"
-            returncode, stdout, stderr = await self.ssh.execute(count_cmd, timeout=30)
+            size, _, summary = stdout.partition("\n")
+            if size.strip().isdigit():
+                result["file_size_bytes"] = int(size)
+                result["status"] = "completed"
 
-            if stdout.strip():
-                result["packet_count"] = int(stdout.strip())
+            match = _CAPTURED_RE.search(summary)
+            if match:
+                result["packet_count"] = int(match.group(1))
 
         except Exception as e:
             result["status"] = "error"
@@ -151,25 +369,17 @@ class PacketCapture:
                 self.ssh = SSHClient(self.host)
                 await self.ssh.connect()
 
-            # Basic packet statistics
-            stats_cmd = f"sudo tcpdump -r {self.capture_file} -n -q 2>/dev/null | head -1000"
-            returncode, stdout, stderr = await self.ssh.execute(stats_cmd, timeout=30)
-
-            # Analyze TCP flags
-            tcp_analysis = await self._analyze_tcp_flags()
-
-            # Analyze retransmissions
-            retrans_analysis = await self._analyze_retransmissions()
-
-            # Analyze connection timing
-            timing_analysis = await self._analyze_connection_timing()
-
-            result["analysis"] = {
-                "tcp_flags": tcp_analysis,
-                "retransmissions": retrans_analysis,
-                "timing": timing_analysis
-            }
-
+            # Preferred: fetch the pcap once over SFTP and parse it locally
+            if dpkt is not None:
+                try:
+                    data = await self._read_capture()
+                    result["analysis"] = await asyncio.to_thread(_parse_pcap, data)
+                    result["status"] = "success"
+                    return result
+                except Exception:
+                    pass  # e.g. SFTP unavailable or unreadable file; analyze remotely
+
+            result["analysis"] = await self._remote_analyze_all()
             result["status"] = "success"
 
         except Exception as e:
@@ -178,82 +388,43 @@ class PacketCapture:
 
         return result
 
-    async def _analyze_tcp_flags(self) -> Dict[str, Any]:
-        """Analyze TCP flags in capture."""
-        # Count SYN, ACK, FIN, RST packets
-        cmd = f"""
-        sudo tcpdump -r {self.capture_file} -n 2>/dev/null | grep -oE 'Flags \\[[^\\]]+\\]' | sort | uniq -c
-        """
-
-        returncode, stdout, stderr = await self.ssh.execute(cmd, timeout=30)
+    async def _read_capture(self) -> bytes:
+        """Read the remote capture file into memory over SFTP."""
+        async with self.ssh.conn.start_sftp_client() as sftp:
+            async with sftp.open(
+                self.capture_file, "rb",
+                block_size=_SFTP_BLOCK_SIZE, max_requests=_SFTP_MAX_REQUESTS
+            ) as f:
+                return await f.read()
 
-        flags = {
-            "SYN": 0,
-            "SYN-ACK": 0,
-            "ACK": 0,
-            "FIN": 0,
-            "RST": 0,
-            "PSH": 0
-        }
-
-        for line in stdout.split('\n'):
-            if 'S' in line and 'Flags' in line:
-                count = int(line.strip().split()[0])
-                if 'S.' in line:
-                    flags["SYN-ACK"] += count
-                elif 'S' in line:
-                    flags["SYN"] += count
-            if '.' in line and 'Flags' in line:
-                flags["ACK"] += int(line.strip().split()[0])
-            if 'F' in line:
-                flags["FIN"] += 1
-            if 'R' in line:
-                flags["RST"] += 1
-            if 'P' in line:
-                flags["PSH"] += 1
-
-        return flags
-
-    async def _analyze_retransmissions(self) -> Dict[str, Any]:
-        """Detect TCP retransmissions in capture."""
-        # Use tshark if available, otherwise parse tcpdump output
-        retrans_cmd = f"""
-        sudo tcpdump -r {self.capture_file} -n -v 2>/dev/null | \
-        grep -i "retransmission\\|duplicate\\|out-of-order" | wc -l
+    async def _remote_analyze_all(self) -> Dict[str, Dict[str, Any]]:
         """
+        Analyze the capture on the probe in one pass.
 
-        returncode, stdout, stderr = await self.ssh.execute(retrans_cmd, timeout=30)
-
-        retrans_count = 0
-        if stdout.strip():
-            retrans_count = int(stdout.strip())
-
-        return {
-            "retransmission_count": retrans_count,
-            "detected": retrans_count > 0
-        }
-
-    async def _analyze_connection_timing(self) -> Dict[str, Any]:
-        """Analyze connection establishment timing from packets."""
-        # Extract SYN and SYN-ACK timestamps to calculate handshake time
-        cmd = f"""
-        sudo tcpdump -r {self.capture_file} -n -ttt 2>/dev/null | head -50
+        Prefers tshark, which emits only the needed columns and does its own
+        retransmission analysis, and falls back to tcpdump text; awk reduces
+        either to a single JSON line.
         """
+        cmd = (
+            "if command -v tshark >/dev/null 2>&1; then "
+            f"sudo tshark -r {self.capture_file} -T fields {_TSHARK_FIELDS} 2>/dev/null | "
+            f"awk -F'\\t' '{_TSHARK_ANALYZE_AWK}'; "
+            "else "
+            f"sudo tcpdump -r {self.capture_file} -nn -tt 2>/dev/null | "
+            f"awk '{_TCPDUMP_ANALYZE_AWK}'; "
+            "fi"
+        )
 
         returncode, stdout, stderr = await self.ssh.execute(cmd, timeout=30)
-
-        timing = {
-            "handshake_ms": None,
-            "first_packet_time": None,
-            "last_packet_time": None
-        }
-
-        lines = stdout.strip().split('\n')
-        if len(lines) >= 3:
-            # This is approximate - proper timing needs tshark
-            timing["handshake_detected"] = True
-
-        return timing
+        data = json.loads(stdout)
+
+        return _analysis_result(
+            data["tcp_flags"],
+            data["retransmission_count"],
+            data["first_ts"],
+            data["last_ts"],
+            data["handshake_ms"]
+        )
 
     async def download_capture(self, local_path: Path) -> bool:
         """Download capture file to local machine."""
@@ -262,15 +433,19 @@ class PacketCapture:
                 self.ssh = SSHClient(self.host)
                 await self.ssh.connect()
 
-            # Use scp to download file
-            # Note: This is a simplified version, actual implementation
-            # would use asyncssh's sftp functionality
-            download_cmd = f"cat {self.capture_file}"
-            returncode, stdout, stderr = await self.ssh.execute(download_cmd, timeout=60)
-
-            if returncode == 0:
-                local_path.write_bytes(stdout.encode('latin-1'))
-                return True
+            # Copy over SFTP so the pcap stays bytes end to end; 128 KiB reads
+            # with many requests in flight keep the SSH window full
+            async with self.ssh.conn.start_sftp_client() as sftp:
+                await asyncio.wait_for(
+                    sftp.get(
+                        self.capture_file,
+                        str(local_path),
+                        block_size=_SFTP_BLOCK_SIZE,
+                        max_requests=_SFTP_MAX_REQUESTS
+                    ),
+                    timeout=60
+                )
+            return True
 
         except Exception as e:
             print(f"Download failed: {e}")
@@ -281,7 +456,7 @@ class PacketCapture:
         """Remove capture file from remote host."""
         if self.capture_file and self.ssh:
             try:
-                cleanup_cmd = f"sudo rm -f {self.capture_file}"
+                cleanup_cmd = f"sudo rm -f {self.capture_file} {self.capture_file}.err"
                 await self.ssh.execute(cleanup_cmd, timeout=5)
             except Exception:
                 pass
@@ -357,8 +532,12 @@ async def capture_during_test(
             capture_stop = await capture.stop_capture()
             result["capture_result"] = capture_stop
 
-            # Analyze capture
-            if capture_stop["status"] == "completed" and capture_stop["packet_count"] > 0:
+            # Analyze capture, unless the test failed and its capture would be
+            # discarded anyway
+            test_succeeded = test_result.get("success", True) if isinstance(test_result, dict) else True
+            if not test_succeeded:
+                result["status"] = "test_failed"
+            elif capture_stop["status"] == "completed" and capture_stop["packet_count"] > 0:
                 analysis = await capture.analyze_capture()
                 result["analysis"] = analysis
                 result["status"] = "success"
@@ -392,8 +571,7 @@ async def multi_target_capture(
 
     try:
         # Build filter for all targets
-        filter_parts = [f"host {ip}" for ip in targets]
-        capture_filter = " or ".join(filter_parts)
+        capture_filter = _targets_filter(targets)
 
         async with PacketCapture(host) as capture:
             # Start capture
@@ -1,11 +1,16 @@
 """Network throughput testing using iperf3."""
 
 import asyncio
-import json
+from contextlib import nullcontext
 from typing import Any, Dict, List, Optional
 
+try:
+    import orjson as _json
+except ImportError:  # orjson is optional; fall back to the stdlib parser
+    import json as _json
+
 from cnf.registry import Host
-from cnf.ssh import SSHClient
+from cnf.ssh import SSHClient, ssh_pool
 
 
 async def iperf3_test_remote(
@@ -16,6 +21,7 @@ async def iperf3_test_remote(
     reverse: bool = False,
     udp: bool = False,
     parallel: int = 1,
+    ssh: Optional[SSHClient] = None,
 ) -> Dict[str, Any]:
     """Run iperf3 throughput test from remote probe host."""
     result = {
@@ -29,7 +35,7 @@ async def iperf3_test_remote(
     }
     
     try:
-        async with SSHClient(host) as ssh:
+        async with (nullcontext(ssh) if ssh else ssh_pool.acquire(host)) as ssh:
             # Check if iperf3 is available
             check_code, _, _ = await ssh.execute("which iperf3", timeout=5)
             if check_code != 0:
@@ -59,7 +65,7 @@ async def iperf3_test_remote(
             if returncode == 0 and stdout:
                 try:
                     # Parse JSON output
-                    data = json.loads(stdout)
+                    data = _json.loads(stdout)
                     
                     # Extract throughput
                     if "end" in data and "sum_received" in data["end"]:
@@ -71,7 +77,7 @@ async def iperf3_test_remote(
                         result["retransmits"] = data["end"].get("sum_sent", {}).get("retransmits", 0)
                         result["bytes_transferred"] = data["end"]["sum_received"].get("bytes", 0)
                     
-                except json.JSONDecodeError:
+                except _json.JSONDecodeError:
                     result["error"] = "Failed to parse iperf3 JSON output"
             else:
                 result["error"] = stderr or "iperf3 test failed"
@@ -83,7 +89,12 @@ async def iperf3_test_remote(
 
 
 async def run_throughput_tests(host: Host, targets: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    """Run throughput tests for all targets from a probe host."""
+    """Run throughput tests for all targets from a probe host.
+    
+    Targets run one at a time on purpose: concurrent iperf3 runs would
+    share the probe's bandwidth (skewing every result) and an iperf3
+    server rejects a second client while a test is in progress.
+    """
     results = []
     
     for target in targets:
@@ -2,14 +2,21 @@
 
 import asyncio
 import ssl
-from typing import Any, Dict, List
+from contextlib import nullcontext
+from typing import Any, Dict, List, Optional
 
 from cnf.registry import Host
-from cnf.ssh import SSHClient
-from cnf.utils import Timer
+from cnf.ssh import SSHClient, ssh_pool
+from cnf.utils import Timer, run_bounded
 
+# Targets tested at once from one probe
+_MAX_CONCURRENT_TARGETS = 8
 
-async def tls_test_remote(host: Host, target: str, port: int = 443, timeout: int = 10, verify: bool = True) -> Dict[str, Any]:
+
+async def tls_test_remote(
+    host: Host, target: str, port: int = 443, timeout: int = 10, verify: bool = True,
+    ssh: Optional[SSHClient] = None
+) -> Dict[str, Any]:
     """Test TLS handshake from remote probe host."""
     result = {
         "host": target,
@@ -21,7 +28,7 @@ async def tls_test_remote(host: Host, target: str, port: int = 443, timeout: int
     }
     
     try:
-        async with SSHClient(host) as ssh:
+        async with (nullcontext(ssh) if ssh else ssh_pool.acquire(host)) as ssh:
             # Use openssl s_client for TLS testing
             verify_flag = "" if verify else "-noverify"
             cmd = f"timeout {timeout} openssl s_client -connect {target}:{port} {verify_flag} -brief 2>&1 | head -20"
@@ -66,9 +73,9 @@ async def tls_test_remote(host: Host, target: str, port: int = 443, timeout: int
 
 async def run_tls_tests(host: Host, targets: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """Run TLS tests for all targets from a probe host."""
-    results = []
+    sem = asyncio.Semaphore(_MAX_CONCURRENT_TARGETS)
     
-    for target in targets:
+    async def run_target(target: Dict[str, Any]) -> Dict[str, Any]:
         target_host = target.get("host")
         port = target.get("port", 443)
         timeout = target.get("timeout_s", 10)
@@ -76,6 +83,6 @@ async def run_tls_tests(host: Host, targets: List[Dict[str, Any]]) -> List[Dict[
         
         result = await tls_test_remote(host, target_host, port, timeout, verify)
         result["name"] = target.get("name", f"{target_host}:{port}")
-        results.append(result)
+        return result
     
-    return results
+    return list(await asyncio.gather(*(run_bounded(sem, run_target(t)) for t in targets)))
@@ -2,13 +2,59 @@
 
 import asyncio
 import re
-from typing import Any, Dict, List
+from contextlib import nullcontext
+from typing import Any, Dict, List, Optional
 
 from cnf.registry import Host
-from cnf.ssh import SSHClient
+from cnf.ssh import SSHClient, ssh_pool
+from cnf.utils import run_bounded
 
+# Targets traced at once from one probe
+_MAX_CONCURRENT_TARGETS = 8
 
-async def traceroute_remote(host: Host, target: str, max_hops: int = 30, mode: str = "icmp", port: int = 443) -> Dict[str, Any]:
+# traceroute hop line: " 3  router.example (10.0.0.1)  1.234 ms  1.100 ms  1.050 ms"
+_HOP_RE = re.compile(r'^[ \t]*(\d+)[ \t]+(.+)$')
+_IP_RE = re.compile(r'\((\d+\.\d+\.\d+\.\d+)\)|(\d+\.\d+\.\d+\.\d+)')
+_LAT_RE = re.compile(r'([\d.]+)\s*ms')
+
+# mtr -r -w hop line: "  1.|-- 172.31.0.1   0.0%    10    0.3   0.3   0.2   0.4   0.1"
+_MTR_RE = re.compile(
+    r'^[ \t]*(\d+)\.\|--\s+(\S+)\s+([\d.]+)%\s+(\d+)\s+([\d.]+)\s+([\d.]+)\s+([\d.]+)\s+([\d.]+)\s+([\d.]+)',
+    re.MULTILINE,
+)
+
+
+def _parse_hop(hop_match: re.Match) -> Dict[str, Any]:
+    """Build a hop dict from a _HOP_RE match."""
+    hop_data = hop_match.group(2).strip()
+    
+    hop_info = {
+        "hop": int(hop_match.group(1)),
+        "raw": hop_data,
+    }
+    
+    # Try to parse IP and latency
+    ip_match = _IP_RE.search(hop_data)
+    if ip_match:
+        hop_info["ip"] = ip_match.group(1) or ip_match.group(2)
+    
+    # Parse latencies (ms)
+    latencies = [float(l) for l in _LAT_RE.findall(hop_data)]
+    if latencies:
+        hop_info["latencies_ms"] = latencies
+        hop_info["avg_latency_ms"] = sum(latencies) / len(latencies)
+    
+    return hop_info
+
+
+async def traceroute_remote(
+    host: Host,
+    target: str,
+    max_hops: int = 30,
+    mode: str = "icmp",
+    port: int = 443,
+    ssh: Optional[SSHClient] = None
+) -> Dict[str, Any]:
     """Run traceroute from remote probe host."""
     result = {
         "target": target,
@@ -20,7 +66,7 @@ async def traceroute_remote(host: Host, target: str, max_hops: int = 30, mode: s
     }
     
     try:
-        async with SSHClient(host) as ssh:
+        async with (nullcontext(ssh) if ssh else ssh_pool.acquire(host)) as ssh:
             # Construct traceroute command based on mode
             if mode == "tcp":
                 cmd = f"traceroute -T -p {port} -m {max_hops} -w 5 {target} 2>&1"
@@ -29,40 +75,37 @@ async def traceroute_remote(host: Host, target: str, max_hops: int = 30, mode: s
             else:  # icmp
                 cmd = f"traceroute -I -m {max_hops} -w 5 {target} 2>&1"
             
-            returncode, stdout, stderr = await ssh.execute(cmd, timeout=max_hops * 5 + 10)
+            # Stream hops as traceroute prints them and stop once the
+            # destination answers instead of waiting for the command to exit
+            output = []
+            dest_ip = None
+            timed_out = False
+            try:
+                async with asyncio.timeout(max_hops * 5 + 10):
+                    async with ssh.conn.create_process(cmd) as proc:
+                        async for line in proc.stdout:
+                            output.append(line)
+                            hop_match = _HOP_RE.match(line)
+                            if not hop_match:
+                                # Header: "traceroute to host (1.2.3.4), 30 hops max, ..."
+                                if dest_ip is None and (ip_match := _IP_RE.search(line)):
+                                    dest_ip = ip_match.group(1) or ip_match.group(2)
+                                continue
+                            
+                            hop_info = _parse_hop(hop_match)
+                            result["hops"].append(hop_info)
+                            if dest_ip and hop_info.get("ip") == dest_ip:
+                                break
+            except TimeoutError:
+                timed_out = True
+                result["error"] = "Traceroute timed out"
             
-            if stdout:
+            # A timed-out trace keeps its partial hops but is not a success
+            result["total_hops"] = len(result["hops"])
+            if output and not timed_out:
                 result["success"] = True
-                
-                # Parse traceroute output
-                lines = stdout.strip().split('\n')
-                for line in lines[1:]:  # Skip first line (header)
-                    hop_match = re.match(r'\s*(\d+)\s+(.+)', line)
-                    if hop_match:
-                        hop_num = int(hop_match.group(1))
-                        hop_data = hop_match.group(2).strip()
-                        
-                        hop_info = {
-                            "hop": hop_num,
-                            "raw": hop_data,
-                        }
-                        
-                        # Try to parse IP and latency
-                        ip_match = re.search(r'\(?([\d.]+)\)?', hop_data)
-                        if ip_match:
-                            hop_info["ip"] = ip_match.group(1)
-                        
-                        # Parse latencies (ms)
-                        latencies = re.findall(r'([\d.]+)\s*ms', hop_data)
-                        if latencies:
-                            hop_info["latencies_ms"] = [float(l) for l in latencies]
-                            hop_info["avg_latency_ms"] = sum(hop_info["latencies_ms"]) / len(hop_info["latencies_ms"])
-                        
-                        result["hops"].append(hop_info)
-                
-                result["total_hops"] = len(result["hops"])
-            else:
-                result["error"] = stderr or "No output"
+            elif not result["error"]:
+                result["error"] = "No output"
                 
     except Exception as e:
         result["error"] = f"Traceroute failed: {e}"
@@ -70,7 +113,9 @@ async def traceroute_remote(host: Host, target: str, max_hops: int = 30, mode: s
     return result
 
 
-async def mtr_remote(host: Host, target: str, count: int = 10, timeout: int = 60) -> Dict[str, Any]:
+async def mtr_remote(
+    host: Host, target: str, count: int = 10, timeout: int = 60, ssh: Optional[SSHClient] = None
+) -> Dict[str, Any]:
     """Run MTR (My TraceRoute) from remote probe host."""
     result = {
         "target": target,
@@ -80,7 +125,7 @@ async def mtr_remote(host: Host, target: str, count: int = 10, timeout: int = 60
     }
     
     try:
-        async with SSHClient(host) as ssh:
+        async with (nullcontext(ssh) if ssh else ssh_pool.acquire(host)) as ssh:
             # Run MTR in report mode with JSON output if available
             cmd = f"mtr -r -c {count} -w {target} 2>&1"
             
@@ -90,30 +135,20 @@ async def mtr_remote(host: Host, target: str, count: int = 10, timeout: int = 60
                 result["success"] = True
                 result["raw_output"] = stdout
                 
-                # Parse MTR output (basic parsing)
-                lines = stdout.strip().split('\n')
-                for line in lines:
-                    if line.strip().startswith(('HOST:', 'Start:')):
-                        continue
-                    
-                    # Parse MTR line format
-                    parts = line.split()
-                    if len(parts) >= 7:
-                        try:
-                            hop_info = {
-                                "hop": int(parts[0].rstrip('.')),
-                                "host": parts[1],
-                                "loss_pct": float(parts[2].rstrip('%')),
-                                "sent": int(parts[3]),
-                                "last_ms": float(parts[4]),
-                                "avg_ms": float(parts[5]),
-                                "best_ms": float(parts[6]),
-                                "worst_ms": float(parts[7]) if len(parts) > 7 else None,
-                                "stddev_ms": float(parts[8]) if len(parts) > 8 else None,
-                            }
-                            result["hops"].append(hop_info)
-                        except (ValueError, IndexError):
-                            continue
+                # Parse MTR report lines
+                for match in _MTR_RE.finditer(stdout):
+                    hop_num, hop_host, loss, sent, last, avg, best, worst, stddev = match.groups()
+                    result["hops"].append({
+                        "hop": int(hop_num),
+                        "host": hop_host,
+                        "loss_pct": float(loss),
+                        "sent": int(sent),
+                        "last_ms": float(last),
+                        "avg_ms": float(avg),
+                        "best_ms": float(best),
+                        "worst_ms": float(worst),
+                        "stddev_ms": float(stddev),
+                    })
             else:
                 result["error"] = "MTR not available or failed"
                 
@@ -125,9 +160,9 @@ async def mtr_remote(host: Host, target: str, count: int = 10, timeout: int = 60
 
 async def run_traceroute_tests(host: Host, targets: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """Run traceroute/MTR tests for all targets from a probe host."""
-    results = []
+    sem = asyncio.Semaphore(_MAX_CONCURRENT_TARGETS)
     
-    for target in targets:
+    async def run_target(target: Dict[str, Any]) -> Dict[str, Any]:
         target_host = target.get("host")
         max_hops = target.get("max_hops", 30)
         mode = target.get("mode", "icmp")
@@ -140,6 +175,6 @@ async def run_traceroute_tests(host: Host, targets: List[Dict[str, Any]]) -> Lis
             result = await traceroute_remote(host, target_host, max_hops, mode, port)
         
         result["name"] = target.get("name", target_host)
-        results.append(result)
+        return result
     
-    return results
+    return list(await asyncio.gather(*(run_bounded(sem, run_target(t)) for t in targets)))
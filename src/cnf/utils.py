@@ -1,14 +1,31 @@
 """Utility functions for Cloud NetTest Framework."""
 
 import asyncio
+import functools
 import json
+import os
+import re
 import time
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Awaitable, Dict, List, Optional, Set
 
 import yaml
 
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib json module
+    orjson = None
+
+try:
+    from yaml import CSafeDumper as _YamlDumper, CSafeLoader as _YamlLoader
+except ImportError:  # PyYAML built without libyaml
+    from yaml import SafeDumper as _YamlDumper, SafeLoader as _YamlLoader
+
+# Per-probe "time=1.23 ms" and summary "min/avg/max = ..." ping latencies
+_TIME_RE = re.compile(r'time[=\s]+([\d.]+)\s*ms')
+_AVG_RE = re.compile(r'avg[=/\s]+([\d.]+)')
+
 
 def get_timestamp(fmt: str = "iso") -> str:
     """Get current UTC timestamp."""
@@ -23,6 +40,13 @@ def get_timestamp(fmt: str = "iso") -> str:
 
 def expand_path(path: str | Path) -> Path:
     """Expand user home directory in path."""
+    # Relative paths resolve against the cwd, so it is part of the cache key
+    return _expand_path_cached(str(path), os.getcwd())
+
+
+@functools.lru_cache(maxsize=256)
+def _expand_path_cached(path: str, cwd: str) -> Path:
+    """Memoized expand_path; resolve() stats every path component."""
     return Path(path).expanduser().resolve()
 
 
@@ -45,23 +69,30 @@ def get_config_dir() -> Path:
 def load_yaml(file_path: Path) -> Dict[str, Any]:
     """Load YAML file."""
     with open(file_path) as f:
-        return yaml.safe_load(f)
+        return yaml.load(f, Loader=_YamlLoader)
 
 
 def save_yaml(data: Dict[str, Any], file_path: Path):
     """Save data to YAML file."""
     with open(file_path, "w") as f:
-        yaml.dump(data, f, default_flow_style=False, sort_keys=False)
+        yaml.dump(data, f, Dumper=_YamlDumper, default_flow_style=False, sort_keys=False)
 
 
 def load_json(file_path: Path) -> Dict[str, Any]:
     """Load JSON file."""
+    if orjson is not None:
+        return orjson.loads(Path(file_path).read_bytes())
     with open(file_path) as f:
         return json.load(f)
 
 
 def save_json(data: Dict[str, Any], file_path: Path, pretty: bool = True):
     """Save data to JSON file."""
+    if orjson is not None:
+        # Non-str keys are stringified, as json.dump does
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if pretty else 0)
+        Path(file_path).write_bytes(orjson.dumps(data, option=option))
+        return
     with open(file_path, "w") as f:
         if pretty:
             json.dump(data, f, indent=2)
@@ -69,15 +100,28 @@ def save_json(data: Dict[str, Any], file_path: Path, pretty: bool = True):
             json.dump(data, f)
 
 
+# Directories already created by ensure_dir in this process
+_ENSURED_DIRS: Set[Path] = set()
+
+
 def ensure_dir(path: Path) -> Path:
     """Ensure directory exists."""
     path = expand_path(path)
-    path.mkdir(parents=True, exist_ok=True)
+    if path not in _ENSURED_DIRS:
+        path.mkdir(parents=True, exist_ok=True)
+        _ENSURED_DIRS.add(path)
     return path
 
 
+async def run_bounded(semaphore: asyncio.Semaphore, coro: Awaitable[Any]) -> Any:
+    """Await coro while holding semaphore (caps concurrency under gather)."""
+    async with semaphore:
+        return await coro
+
+
 async def run_command(cmd: List[str], timeout: int = 30) -> tuple[int, str, str]:
     """Run a shell command asynchronously."""
+    proc = None
     try:
         proc = await asyncio.create_subprocess_exec(
             *cmd,
@@ -85,11 +129,24 @@ async def run_command(cmd: List[str], timeout: int = 30) -> tuple[int, str, str]
             stderr=asyncio.subprocess.PIPE,
         )
         
-        stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=timeout)
-        return proc.returncode, stdout.decode(), stderr.decode()
-    except asyncio.TimeoutError:
+        async with asyncio.timeout(timeout):
+            stdout, stderr = await proc.communicate()
+        return (
+            proc.returncode,
+            stdout.decode("utf-8", errors="replace"),
+            stderr.decode("utf-8", errors="replace"),
+        )
+    except TimeoutError:
         if proc:
+            # Kill and reap the child so no zombie is left. wait() is bounded
+            # too: a grandchild holding the inherited pipes open would block
+            # it until EOF, and the transport closes itself once they do.
             proc.kill()
+            try:
+                async with asyncio.timeout(1):
+                    await proc.wait()
+            except TimeoutError:
+                pass
         return -1, "", "Command timed out"
     except Exception as e:
         return -1, "", str(e)
@@ -97,40 +154,45 @@ async def run_command(cmd: List[str], timeout: int = 30) -> tuple[int, str, str]
 
 def parse_latency(output: str) -> Optional[float]:
     """Parse latency from ping output (in milliseconds)."""
-    import re
-    
-    # Look for patterns like "time=1.23 ms" or "time=1.23ms"
-    match = re.search(r'time[=\s]+([\d.]+)\s*ms', output)
-    if match:
-        return float(match.group(1))
-    
-    # Look for avg latency in summary
-    match = re.search(r'avg[=/\s]+([\d.]+)', output)
-    if match:
-        return float(match.group(1))
-    
-    return None
+    match = _TIME_RE.search(output) or _AVG_RE.search(output)
+    return float(match.group(1)) if match else None
+
+
+def parse_latencies(outputs: List[str]) -> List[float]:
+    """Parse latencies from many ping outputs, skipping unparseable ones."""
+    return [
+        float(m.group(1))
+        for m in (_TIME_RE.search(o) or _AVG_RE.search(o) for o in outputs)
+        if m
+    ]
 
 
 class Timer:
     """Simple context manager for timing operations."""
     
     def __init__(self):
-        self.start_time = None
-        self.end_time = None
-        self.elapsed = None
+        self.start_ns = None
+        self.end_ns = None
+        self.elapsed_ns = None
     
     def __enter__(self):
-        self.start_time = time.perf_counter()
+        self.start_ns = time.perf_counter_ns()
         return self
     
     def __exit__(self, *args):
-        self.end_time = time.perf_counter()
-        self.elapsed = self.end_time - self.start_time
+        self.end_ns = time.perf_counter_ns()
+        self.elapsed_ns = self.end_ns - self.start_ns
+    
+    @property
+    def elapsed(self) -> Optional[float]:
+        """Get elapsed time in seconds."""
+        if self.elapsed_ns is not None:
+            return self.elapsed_ns / 1e9
+        return None
     
     @property
     def elapsed_ms(self) -> float:
         """Get elapsed time in milliseconds."""
-        if self.elapsed is not None:
-            return self.elapsed * 1000
+        if self.elapsed_ns is not None:
+            return self.elapsed_ns / 1e6
         return 0.0